@@ -129,6 +129,15 @@ class AK8963:
 
         return tuple(xyz)
 
+    def read_raw_into(self, buf):
+        """
+        Reads the 6 output registers from HXL to HZH into `buf` as they are,
+        ie. little-endian X, Y, Z counts. No adjustement, scaling or
+        calibration is applied.
+        """
+        self.i2c.readfrom_mem_into(self.address, _HXL, buf)
+        self._register_char(_ST2) # Enable updating readings again
+
     @property
     def adjustement(self):
         return self._adjustement
@@ -0,0 +1,256 @@
+"""
+Benchmarks of the sample pipeline and the fusion code, runs in CPython and
+the MicroPython Unix port.
+
+    $ python bench.py                 compare against bench_baseline.json
+    $ python bench.py --save          store the results as the new baseline
+    $ micropython bench.py madgwick   only benchmarks with 'madgwick' in the name
+
+Exits with status 1 if a benchmark is more than REGRESSION slower than its
+baseline.
+
+Every benchmark reports the best time per sample of REPEATS runs and the
+memory allocated per sample, and the time's change from the baseline of the
+same Python implementation. In MicroPython the allocation is the heap bytes
+from `gc.mem_alloc()` with the GC disabled, every temporary counts, which
+is the churn the GC has to collect on the tracker. CPython frees
+temporaries right away and keeps no such total, so it reports the peak of
+the memory traced by `tracemalloc` during a sample above the memory in use
+before it. That includes the temporaries alive at the same time, it is
+below the total for code which allocates many short lived objects and
+only zero for code which allocates nothing.
+
+The `sample` benchmarks are a whole capture loop iteration, reading the
+sensor and writing a record, and in MicroPython give the highest
+SAMPLE_FREQ the loop sustains.
+
+The drivers run against a static I2C bus, so driver times exclude the bus
+transfers of the real hardware.
+"""
+
+# pylint: disable=import-error
+import gc
+import json
+import sys
+
+try:
+    import utime
+except ImportError:
+    import sim
+    sim.install()
+    import utime
+import ustruct
+# pylint: enable=import-error
+
+import mpu9250
+from ak8963 import AK8963
+from madgwick_ahrs import MadgwickAHRS, update_6DOF_fast, update_9DOF_fast
+from mpu6500 import MPU6500
+from quaternion import Quaternion
+from session_format import FLOAT32_FMT, RECORD_RAW, FLAG_TIMESTAMPS, FLAG_DELTA
+from session_writer import SessionWriter, to_base64
+
+BASELINE = 'bench_baseline.json'
+IMPLEMENTATION = sys.implementation.name
+
+# Slower than the baseline by more than this is flagged as a regression
+REGRESSION = 0.10
+# Timed runs per benchmark, the fastest counts
+REPEATS = 5
+
+
+class StaticI2C:
+    """I2C bus of an MPU6500 and AK8963 whose registers never change."""
+    def __init__(self):
+        mpu = bytearray(256)
+        mpu[0x75] = 0x71  # WHO_AM_I
+        mpu[0x3b:0x49] = ustruct.pack('>7h', 120, -340, 16300, 1500, 25, -13, 402)
+        ak = bytearray(256)
+        ak[0x00] = 0x48  # WIA
+        ak[0x10:0x13] = b'\x80\x80\x80'  # ASAX, ASAY, ASAZ
+        ak[0x03:0x09] = ustruct.pack('<3h', 130, -45, -230)
+        self._registers = {0x68: mpu, 0x0c: ak}
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        registers = self._registers[addr]
+        for i in range(len(buf)):
+            buf[i] = registers[memaddr + i]
+
+    def writeto_mem(self, addr, memaddr, buf):
+        pass
+
+
+class NullStream:
+    def write(self, data):
+        return len(data)
+
+
+def _sensor():
+    i2c = StaticI2C()
+    mpu6500 = MPU6500(i2c)
+    ak8963 = AK8963(i2c)
+    return mpu9250.MPU9250(i2c, mpu6500=mpu6500, ak8963=ak8963, mag_axis_map=(1, 0, 2), mag_axis_sign=(1, 1, -1))
+
+
+def benchmarks():
+    """
+    :return: List of the name, setup and run function of every benchmark,
+        setup returns the state run is called with
+    """
+    reading = (0.01, -0.02, 0.03, 0.12, -0.34, 9.81, 19.5, -6.75, -34.5)
+    gyro, acceleration, magnetic = reading[0:3], reading[3:6], reading[6:9]
+
+    def text_record(_):
+        # Text sessions before the binary format
+        return ''.join(str(value) + ' ' for value in reading)
+
+    def float32_record(buf):
+        ustruct.pack_into(FLOAT32_FMT, buf, 0, *reading)
+
+    def raw_sample():
+        return SessionWriter(NullStream(), _sensor(), 20, record_format=RECORD_RAW, flags=FLAG_TIMESTAMPS)
+
+    def delta_sample():
+        return SessionWriter(NullStream(), _sensor(), 20, record_format=RECORD_RAW, flags=FLAG_TIMESTAMPS | FLAG_DELTA)
+
+    def float_sample():
+        sensor = _sensor()
+        return SessionWriter(NullStream(), sensor, 20, flags=FLAG_TIMESTAMPS), sensor
+
+    def run_float_sample(state):
+        writer, sensor = state
+        acceleration, gyro, _ = sensor.read_motion()
+        writer.write(gyro, acceleration, sensor.magnetic, 50000)
+
+    return [
+        ('mpu6500.acceleration', _sensor, lambda sensor: sensor.mpu6500.acceleration),
+        ('mpu6500.gyro', _sensor, lambda sensor: sensor.mpu6500.gyro),
+        ('mpu6500.read_all', _sensor, lambda sensor: sensor.mpu6500.read_all()),
+        ('mpu9250.magnetic', _sensor, lambda sensor: sensor.magnetic),
+        ('mpu9250.read_raw_into', lambda: (_sensor(), bytearray(14), bytearray(6)),
+         lambda state: state[0].read_raw_into(state[1], state[2])),
+        ('encode.text', lambda: None, text_record),
+        ('encode.float32', lambda: bytearray(36), float32_record),
+        ('encode.to_base64', lambda: bytearray(36), to_base64),
+        ('sample.raw', raw_sample, lambda writer: writer.write_raw(50000)),
+        ('sample.raw_delta', delta_sample, lambda writer: writer.write_raw(50000)),
+        ('sample.float32', float_sample, run_float_sample),
+        ('quaternion.mul', lambda: (Quaternion(0.9, 0.1, -0.3, 0.2), Quaternion(0.5, 0.5, 0.5, 0.5)),
+         lambda state: state[0] * state[1]),
+        ('quaternion.imul', lambda: (Quaternion(0.9, 0.1, -0.3, 0.2), Quaternion(1, 0, 0, 0)),
+         lambda state: state[0].imul(state[1])),
+        ('quaternion.normalize_inplace', lambda: Quaternion(0.9, 0.1, -0.3, 0.2),
+         lambda q: q.normalize_inplace()),
+        ('madgwick.update_6DOF', lambda: MadgwickAHRS(1/20, Quaternion(1, 0, 0, 0), 0.1),
+         lambda ahrs: ahrs.update_6DOF(gyro, acceleration)),
+        ('madgwick.update_9DOF', lambda: MadgwickAHRS(1/20, Quaternion(1, 0, 0, 0), 0.1),
+         lambda ahrs: ahrs.update_9DOF(gyro, acceleration, magnetic)),
+        ('madgwick.update_6DOF_fast', lambda: [1.0, 0.0, 0.0, 0.0],
+         lambda q: update_6DOF_fast(q, gyro, acceleration, 0.1, 1/20)),
+        ('madgwick.update_9DOF_fast', lambda: [1.0, 0.0, 0.0, 0.0],
+         lambda q: update_9DOF_fast(q, gyro, acceleration, magnetic, 0.1, 1/20)),
+    ]
+
+
+def allocated(run, state, n):
+    """
+    :return: Bytes allocated per sample over `n` runs, see the module
+        docstring
+    """
+    if IMPLEMENTATION == 'micropython':
+        gc.collect()
+        gc.disable()
+        start = gc.mem_alloc()
+        for _ in range(n):
+            run(state)
+        total = gc.mem_alloc() - start
+        gc.enable()
+        return total / n
+
+    import tracemalloc  # pylint: disable=import-outside-toplevel
+    tracemalloc.start()
+    total = 0
+    for _ in range(n):
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        run(state)
+        total += tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+    return total / n
+
+
+def measure(setup, run, n):
+    """
+    :return: Tuple of the best nanoseconds of REPEATS runs and bytes
+        allocated per sample
+    """
+    state = setup()
+    for _ in range(n // 10):  # warm up
+        run(state)
+
+    best = 0
+    for _ in range(REPEATS):
+        gc.collect()
+        start = utime.ticks_us()
+        for _ in range(n):
+            run(state)
+        ns = utime.ticks_diff(utime.ticks_us(), start) * 1000 / n
+        if not best or ns < best:
+            best = ns
+
+    # Separate run, tracing slows CPython down
+    return best, allocated(run, state, min(n, 100))
+
+
+def load_baseline(path=BASELINE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main(argv):
+    save = '--save' in argv
+    n = 200 if '--quick' in argv else 2000
+    filters = [arg for arg in argv if not arg.startswith('--')]
+
+    baselines = load_baseline()
+    baseline = baselines.get(IMPLEMENTATION, {})
+    results = {}
+    regressions = 0
+
+    print('{:32} {:>12} {:>10} {:>10}'.format('benchmark', 'ns/sample', 'alloc B', 'baseline'))
+    for name, setup, run in benchmarks():
+        if filters and not any(f in name for f in filters):
+            continue
+        ns, alloc = measure(setup, run, n)
+        results[name] = {'ns': round(ns), 'alloc': round(alloc)}
+
+        delta = ''
+        if name in baseline:
+            change = ns / baseline[name]['ns'] - 1
+            delta = '{:+.1f}%{}'.format(change * 100, ' !' if change > REGRESSION else '')
+            regressions += change > REGRESSION
+        print('{:32} {:>12.0f} {:>10.0f} {:>10}'.format(name, ns, alloc, delta))
+
+    # Off the tracker the static bus makes the rates meaningless
+    for name in ('sample.raw', 'sample.raw_delta', 'sample.float32'):
+        if name in results and IMPLEMENTATION == 'micropython':
+            print('max SAMPLE_FREQ of {}: {:.0f} Hz'.format(name, 1e9 / results[name]['ns']))
+
+    if save:
+        baseline.update(results)
+        baselines[IMPLEMENTATION] = baseline
+        with open(BASELINE, 'w') as f:
+            if IMPLEMENTATION == 'micropython':
+                json.dump(baselines, f)
+            else:
+                json.dump(baselines, f, indent=4, sort_keys=True)
+                f.write('\n')
+    elif regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,38 @@
+"""
+Debounced push button for uasyncio tasks.
+"""
+
+# pylint: disable=import-error
+import uasyncio
+from machine import Pin
+# pylint: enable=import-error
+
+
+class Button:
+    """Class which waits for presses of a button that reads 1 while pressed."""
+    def __init__(self, pin, debounce_ms=50):
+        self._pin = pin
+        self._debounce_ms = debounce_ms
+        # Set from the pin interrupt on every edge, waiting tasks sleep in
+        # the scheduler instead of polling the pin
+        self._flag = uasyncio.ThreadSafeFlag()
+        pin.irq(trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING, handler=self._edge)
+
+    def _edge(self, _):
+        self._flag.set()
+
+    async def _settle(self, value):
+        while True:
+            while self._pin.value() != value:
+                await self._flag.wait()
+            await uasyncio.sleep_ms(self._debounce_ms)
+            if self._pin.value() == value:
+                return
+
+    async def pressed(self):
+        """
+        Waits until the button is released, if it is held, and then pressed
+        again, so one press is never counted twice.
+        """
+        await self._settle(0)
+        await self._settle(1)
@@ -0,0 +1,68 @@
+"""
+Serial command dispatcher. Handlers are registered by name and called with
+the rest of the command line split on spaces, eg. `get 3.bin 0 4096` calls
+the `get` handler with `['3.bin', '0', '4096']`.
+
+    @commands.command('issetup')
+    def issetup(args):
+        sys.stdout.write('true')
+
+`serve()` waits for command lines on stdin without polling, so the tracker
+idles in the uasyncio scheduler between commands. Handlers which wait, eg.
+to blink an LED, are `async def` and awaited by `serve()`, so sampling
+tasks keep running meanwhile. A handler which raises, eg. on a mistyped
+argument, is answered with an `error <message>` line and `serve()` goes on
+with the next command.
+"""
+
+# pylint: disable=import-error
+import sys
+import uasyncio
+# pylint: enable=import-error
+
+_handlers = {}
+
+
+def command(name):
+    """
+    Decorator which registers a handler for the command `name`.
+    """
+    def register(handler):
+        _handlers[name] = handler
+        return handler
+    return register
+
+
+def names():
+    return sorted(_handlers)
+
+
+def dispatch(line):
+    """
+    Runs the handler of one command line.
+    :return: False if the command is unknown, the coroutine to await for an
+        async handler and True otherwise
+    """
+    args = line.split()
+    if not args or args[0] not in _handlers:
+        return False
+    result = _handlers[args[0]](args[1:])
+    return True if result is None else result
+
+
+async def serve(stream=None):
+    """
+    Dispatches command lines from `stream`, stdin by default, as they
+    arrive. Runs until cancelled.
+    """
+    reader = uasyncio.StreamReader(sys.stdin.buffer if stream is None else stream)
+    while True:
+        line = await reader.readline()
+        try:
+            result = dispatch(line.decode().rstrip('\r\n'))
+            if result is not True and result is not False:
+                await result
+        except Exception as err:  # pylint: disable=broad-except
+            # Nothing else answers commands, so the server has to outlive
+            # bad input and failing handlers
+            sys.stdout.write('error {}\n'.format(err))
@@ -0,0 +1,110 @@
+"""
+Delta compression of raw records on the tracker, see `FLAG_DELTA` in
+`session_format` for the frame layout.
+
+Consecutive samples of the same sensor differ by a few counts, so most
+differences fit in a single varint byte and a 24 byte raw record with
+timestamp shrinks to 11 to 15 bytes while moving. The encoder only works
+on preallocated buffers and small ints, so it does not allocate per record.
+"""
+
+# pylint: disable=import-error
+import ustruct
+# pylint: enable=import-error
+
+from session_format import (
+    RECORD_RAW, FLAG_TIMESTAMPS, FRAME_FMT, FRAME_HEADER_SIZE, KEYFRAME_INTERVAL, record_size, delta_size
+)
+
+# Counts per record, 7 big-endian MPU6500 and 3 little-endian AK8963 ones
+_COUNTS = 10
+_MOTION_COUNTS = 7
+
+
+class DeltaEncoder:
+    """
+    Class which packs raw records into delta frames, the `SessionWriter` of
+    a `FLAG_DELTA` session writes a frame whenever `add()` returns True and
+    the last partial one with `frame()` when the session stops.
+    """
+    def __init__(self, flags, keyframe_interval=KEYFRAME_INTERVAL):
+        """
+        :param flags: `session_format.FLAG_*` bits of the session
+        :param keyframe_interval: Records per frame
+        """
+        self._timestamps = bool(flags & FLAG_TIMESTAMPS)
+        self._record_size = record_size(RECORD_RAW, flags)
+        self._interval = keyframe_interval
+        self._frame = bytearray(
+            FRAME_HEADER_SIZE + self._record_size + (keyframe_interval - 1) * delta_size(flags))
+        self._frame_view = memoryview(self._frame)
+        self._fill = FRAME_HEADER_SIZE
+        # Values of the previous record, the timestamp and the counts
+        self._elapsed = 0
+        self._counts = [0] * _COUNTS
+        self.count = 0
+
+    def add(self, record, offset=0):
+        """
+        Adds one raw record to the current frame.
+        :param record: Buffer of records in the session layout
+        :param offset: Position of the record in `record`
+        :return: True if the frame is full, write it with `frame()`
+        """
+        frame = self._frame
+        fill = self._fill
+        keyframe = not self.count
+        if keyframe:
+            for i in range(self._record_size):
+                frame[fill + i] = record[offset + i]
+            fill += self._record_size
+
+        if self._timestamps:
+            elapsed = (record[offset] | record[offset + 1] << 8 | record[offset + 2] << 16
+                       | record[offset + 3] << 24)
+            if not keyframe:
+                fill = _varint(frame, fill, elapsed - self._elapsed)
+            self._elapsed = elapsed
+            offset += 4
+
+        counts = self._counts
+        for i in range(_COUNTS):
+            if i < _MOTION_COUNTS:
+                value = record[offset] << 8 | record[offset + 1]
+            else:
+                value = record[offset + 1] << 8 | record[offset]
+            offset += 2
+            if not keyframe:
+                delta = (value - counts[i]) & 0xffff
+                if delta & 0x8000:
+                    delta -= 0x10000
+                fill = _varint(frame, fill, delta)
+            counts[i] = value
+
+        self._fill = fill
+        self.count += 1
+        return self.count >= self._interval
+
+    def frame(self):
+        """
+        Finishes the current frame, the next record starts a new one with a
+        keyframe.
+        :return: Memoryview of the packed frame, empty if it has no records
+        """
+        size = self._fill if self.count else 0
+        if size:
+            ustruct.pack_into(FRAME_FMT, self._frame, 0, size, self.count)
+        self._fill = FRAME_HEADER_SIZE
+        self.count = 0
+        return self._frame_view[:size]
+
+
+def _varint(buf, pos, value):
+    # Zigzag encodes `value` into `buf` at `pos`, returns the end
+    value = value << 1 if value >= 0 else (~value << 1) | 1
+    while value >= 0x80:
+        buf[pos] = value & 0x7f | 0x80
+        value >>= 7
+        pos += 1
+    buf[pos] = value
+    return pos + 1
@@ -0,0 +1,102 @@
+"""
+Garbage collection policy of a capture. Automatic collections are disabled
+and the capture collects right after the writer wrote a block to flash,
+where the loop already pauses, so the GC never stops it in the middle of a
+block. Only if the free heap drops below a reserve it collects early.
+
+The RAW_CAPTURE loop reads into preallocated buffers and allocates next to
+nothing, so it only collects after block writes.
+"""
+
+# pylint: disable=import-error
+import gc
+import utime
+# pylint: enable=import-error
+
+# Collect before the next block write if less heap than this is free
+RESERVE = 16 * 1024
+# Records between checks of the free heap against the reserve, reading it
+# walks the heap
+CHECK_INTERVAL = 64
+
+
+class GcPolicy:
+    """
+    Class which runs the collections of a capture and keeps the free heap
+    watermarks, `low_water` the least free heap seen and `high_water` the
+    most free after a collection.
+    """
+    def __init__(self, reserve=RESERVE, check_interval=CHECK_INTERVAL):
+        """
+        :param reserve: Free heap in bytes below which to collect early
+        :param check_interval: Writes between checks of the reserve
+        """
+        self.reserve = reserve
+        self.check_interval = check_interval
+        self.collections = 0
+        self.worst_collect_us = 0
+        self.low_water = 0
+        self.high_water = 0
+        self._flushes = 0
+        self._writes = 0
+        self._enabled = True
+
+    def start(self, writer):
+        """
+        Collects and disables automatic collections for the capture. Call
+        `stop()` in a `finally`, an error escaping the capture, eg. a full
+        flash, would leave them disabled otherwise.
+        :param writer: The SessionWriter of the capture
+        """
+        self._enabled = gc.isenabled()
+        self._flushes = writer.flushes
+        self._writes = 0
+        gc.collect()
+        self.low_water = self.high_water = gc.mem_free()
+        gc.disable()
+
+    def stop(self):
+        """
+        Restores automatic collections.
+        """
+        if self._enabled:
+            gc.enable()
+
+    def after_write(self, writer):
+        """
+        Call after every write to `writer`. Collects if it wrote a block
+        since the last call, or every `check_interval` writes if the free
+        heap is below the reserve.
+        """
+        flushes = writer.flushes
+        if flushes != self._flushes:
+            self._flushes = flushes
+            self._writes = 0
+            self._low_water()
+            self.collect()
+            return
+        self._writes += 1
+        if self._writes >= self.check_interval:
+            self._writes = 0
+            if self._low_water() < self.reserve:
+                self.collect()
+
+    def _low_water(self):
+        free = gc.mem_free()
+        if free < self.low_water:
+            self.low_water = free
+        return free
+
+    def collect(self):
+        """
+        Collects now and updates the watermarks.
+        """
+        start = utime.ticks_us()
+        gc.collect()
+        took = utime.ticks_diff(utime.ticks_us(), start)
+        self.collections += 1
+        if took > self.worst_collect_us:
+            self.worst_collect_us = took
+        free = gc.mem_free()
+        if free > self.high_water:
+            self.high_water = free
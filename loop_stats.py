@@ -0,0 +1,137 @@
+"""
+Timing of the capture loop phases in fixed size histograms, so it runs for
+a whole match without allocating. The statistics are written to the
+session footer, see `session_format`, and shown by the `stats` command.
+"""
+
+# pylint: disable=import-error
+import gc
+import ustruct
+import utime
+# pylint: enable=import-error
+
+from session_format import FOOTER_FMT, FOOTER_MAGIC, FOOTER_SIZE
+
+PHASES = ('read', 'encode', 'write', 'iteration')
+
+
+class Histogram:
+    """
+    Class which counts microsecond durations in `buckets` buckets of
+    `bucket_us`, the last one also counts everything longer.
+    """
+    def __init__(self, bucket_us, buckets=64):
+        self.bucket_us = bucket_us
+        self.counts = [0] * buckets
+        self.count = 0
+        self.min = 0
+        self.max = 0
+
+    def add(self, us):
+        counts = self.counts
+        i = us // self.bucket_us
+        if i >= len(counts):
+            i = len(counts) - 1
+        counts[i] += 1
+        if not self.count or us < self.min:
+            self.min = us
+        if us > self.max:
+            self.max = us
+        self.count += 1
+
+    def percentile(self, fraction):
+        """
+        :return: Upper bound of the `fraction` quantile, accurate to one
+            bucket and never above `max`
+        """
+        target = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= target:
+                return min((i + 1) * self.bucket_us, self.max)
+        return self.max
+
+
+class LoopStats:
+    """
+    Class which keeps a histogram of every phase of the capture loop and
+    counts overruns of the sample period and garbage collections.
+    """
+    def __init__(self, period_us, gc_policy=None):
+        """
+        :param period_us: The sample period in microseconds
+        :param gc_policy: The GcPolicy of the capture if it runs the
+            collections, they are counted by it then
+        """
+        self.period_us = period_us
+        self.read = Histogram(20)
+        self.encode = Histogram(10)
+        self.write = Histogram(100)
+        # Two sample periods, longer iterations land in the last bucket
+        self.iteration = Histogram(max(period_us // 32, 1))
+        self.overruns = 0
+        self._gc_policy = gc_policy
+        self._collections = 0
+        self._free = gc.mem_free()
+
+    def add(self, start, read, encoded, written):
+        """
+        Adds one loop iteration.
+        :param start: `utime.ticks_us()` at the start of the iteration
+        :param read: ... after reading the sensor
+        :param encoded: ... after packing the record
+        :param written: ... after writing it
+        """
+        self.read.add(utime.ticks_diff(read, start))
+        self.encode.add(utime.ticks_diff(encoded, read))
+        self.write.add(utime.ticks_diff(written, encoded))
+        took = utime.ticks_diff(written, start)
+        self.iteration.add(took)
+        if took > self.period_us:
+            self.overruns += 1
+
+    def block_written(self):
+        """
+        Call after the writer wrote a block, counts a garbage collection if
+        the free heap grew since the last block. Reading it walks the heap,
+        so it is not done per sample, and several collections in one block
+        count once.
+        """
+        # Free memory only grows when the GC ran, the loop never frees
+        free = gc.mem_free()
+        if free > self._free:
+            self._collections += 1
+        self._free = free
+
+    @property
+    def gc_collections(self):
+        if self._gc_policy is not None:
+            return self._gc_policy.collections
+        return self._collections
+
+    def pack(self, missed=0):
+        """
+        :param missed: Sample deadlines skipped, see `SampleClock`
+        :return: The session footer
+        """
+        values = []
+        for name in PHASES:
+            histogram = getattr(self, name)
+            values += (histogram.count, histogram.min, histogram.max, histogram.percentile(0.99))
+        values += (self.overruns, self.gc_collections, missed, FOOTER_MAGIC, FOOTER_SIZE)
+        return ustruct.pack(FOOTER_FMT, *values)
+
+    def lines(self):
+        """
+        :return: One line per phase of count, min, max and p99 microseconds
+            followed by the overrun and GC counts
+        """
+        lines = []
+        for name in PHASES:
+            histogram = getattr(self, name)
+            lines.append('{} {} {} {} {}'.format(
+                name, histogram.count, histogram.min, histogram.max, histogram.percentile(0.99)))
+        lines.append('overruns {}'.format(self.overruns))
+        lines.append('gc {}'.format(self.gc_collections))
+        return lines
@@ -6,6 +6,11 @@ numpy: https://github.com/numpy/numpy
   OR
 
 ulab (Micropython alternative to numpy): https://github.com/v923z/micropython-ulab.
+
+`update_6DOF_fast()` and `update_9DOF_fast()` are the same updates unrolled
+to scalar arithmetic on a 4-element state list, they create no lists or
+Quaternion objects per sample for use at the sample rate on the tracker and
+when reprocessing sessions.
 """
 
 import math
@@ -138,7 +143,7 @@ class MadgwickAHRS:
             # TODO: find alternative to CPython warnings module
             # warnings.warn("accelerometer is zero")
             return
-        accelerometer = mul(accelerometer, norm(accelerometer))
+        accelerometer = mul(accelerometer, 1/norm(accelerometer))
 
         # NOTE: Quaternion multiplication is non-commutative, do NOT remove the parentheses
         h = q * (Quaternion(0, magnetometer[0], magnetometer[1], magnetometer[2]) * q.conj())
@@ -165,13 +170,13 @@ class MadgwickAHRS:
         step = mul(transpose(J), f)
         step = mul(step, 1/norm(step))  # normalize step magnitude
 
-        # Compute rate of change of quaternion
-        dq = (q * Quaternion(0, gyroscope[0], gyroscope[1], gyroscope[2])) * \
-            0.5 - Quaternion(mul(self.beta, transpose(step))[0])
+        # Compute rate of change of quaternion, (q * (0, gyroscope) - 2 * beta * step) / 2
+        dq = q * Quaternion(0, gyroscope[0], gyroscope[1], gyroscope[2])
+        dq.iadd_scaled(transpose(step)[0], -2*self.beta)
 
-        # Integrate to yield quaternion
-        q += dq * self.sample_period
-        self.quaternion = q/norm(q)  # normalize quaternion
+        # Integrate to yield quaternion, dq becomes the new quaternion so one
+        # a caller kept from an earlier step never changes
+        self.quaternion = dq.imul(0.5*self.sample_period).iadd_scaled(q, 1).normalize_inplace()
 
     def update_6DOF(self, gyroscope, accelerometer):
         """
@@ -192,9 +197,9 @@ class MadgwickAHRS:
 
         # Gradient descent algorithm corrective step
         f = [
-            2*(q[1]*q[3] - q[0]*q[2]) - accelerometer[0],
-            2*(q[0]*q[1] + q[2]*q[3]) - accelerometer[1],
-            2*(0.5 - q[1]**2 - q[2]**2) - accelerometer[2]
+            [2*(q[1]*q[3] - q[0]*q[2]) - accelerometer[0]],
+            [2*(q[0]*q[1] + q[2]*q[3]) - accelerometer[1]],
+            [2*(0.5 - q[1]**2 - q[2]**2) - accelerometer[2]]
         ]
         J = [
             [-2*q[2], 2*q[3], -2*q[0], 2*q[1]],
@@ -204,10 +209,147 @@ class MadgwickAHRS:
         step = mul(transpose(J), f)
         step = mul(step, 1/norm(step))  # normalize step magnitude
 
-        # Compute rate of change of quaternion
-        dq = (q * Quaternion(0, gyroscope[0], gyroscope[1], gyroscope[2])) * \
-            0.5 - Quaternion(mul(self.beta, transpose(step))[0])
+        # Compute rate of change of quaternion, (q * (0, gyroscope) - 2 * beta * step) / 2
+        dq = q * Quaternion(0, gyroscope[0], gyroscope[1], gyroscope[2])
+        dq.iadd_scaled(transpose(step)[0], -2*self.beta)
+
+        # Integrate to yield quaternion, dq becomes the new quaternion so one
+        # a caller kept from an earlier step never changes
+        self.quaternion = dq.imul(0.5*self.sample_period).iadd_scaled(q, 1).normalize_inplace()
+
+
+def update_6DOF_fast(q, gyroscope, accelerometer, beta, sample_period):
+    """
+    `MadgwickAHRS.update_6DOF()` on the state `q` in place.
+    :param q: A four-element list w, x, y, z of the current quaternion
+    :param gyroscope: A three-element array of the gyroscope data in radians
+        per second.
+    :param accelerometer: A three-element array of the accelerometer data.
+        Can be any unit since a normalized value is used.
+    :param beta: Algorithm gain beta
+    :param sample_period: The sample period in seconds
+    """
+    q0, q1, q2, q3 = q
+    gx, gy, gz = gyroscope
+    ax, ay, az = accelerometer
+
+    # Normalize accelerometer measurement
+    n = math.sqrt(ax*ax + ay*ay + az*az)
+    if n == 0:
+        return
+    ax /= n
+    ay /= n
+    az /= n
+
+    # Objective function f and Jacobian J of the gradient descent step
+    f0 = 2*(q1*q3 - q0*q2) - ax
+    f1 = 2*(q0*q1 + q2*q3) - ay
+    f2 = 1 - 2*(q1*q1 + q2*q2) - az
+
+    # step = J' * f
+    s0 = -2*q2*f0 + 2*q1*f1
+    s1 = 2*q3*f0 + 2*q0*f1 - 4*q1*f2
+    s2 = -2*q0*f0 + 2*q3*f1 - 4*q2*f2
+    s3 = 2*q1*f0 + 2*q2*f1
 
-        # Integrate to yield quaternion
-        q += dq * self.sample_period
-        self.quaternion = q / norm(q)  # normalize quaternion
+    _integrate(q, q0, q1, q2, q3, gx, gy, gz, s0, s1, s2, s3, beta, sample_period)
+
+
+def update_9DOF_fast(q, gyroscope, accelerometer, magnetometer, beta, sample_period):
+    """
+    `MadgwickAHRS.update_9DOF()` on the state `q` in place.
+    :param q: A four-element list w, x, y, z of the current quaternion
+    :param gyroscope: A three-element array of the gyroscope data in radians
+        per second.
+    :param accelerometer: A three-element array of the accelerometer data.
+        Can be any unit since a normalized value is used.
+    :param magnetometer: A three-element array of the magnetometer data. Can
+        be any unit since a normalized value is used.
+    :param beta: Algorithm gain beta
+    :param sample_period: The sample period in seconds
+    """
+    q0, q1, q2, q3 = q
+    gx, gy, gz = gyroscope
+    ax, ay, az = accelerometer
+    mx, my, mz = magnetometer
+
+    # Normalize magnetometer measurement
+    n = math.sqrt(mx*mx + my*my + mz*mz)
+    if n == 0:
+        update_6DOF_fast(q, gyroscope, accelerometer, beta, sample_period)
+        return
+    mx /= n
+    my /= n
+    mz /= n
+
+    # Normalize accelerometer measurement
+    n = math.sqrt(ax*ax + ay*ay + az*az)
+    if n == 0:
+        return
+    ax /= n
+    ay /= n
+    az /= n
+
+    q0q0 = q0*q0
+    q0q1 = q0*q1
+    q0q2 = q0*q2
+    q0q3 = q0*q3
+    q1q1 = q1*q1
+    q1q2 = q1*q2
+    q1q3 = q1*q3
+    q2q2 = q2*q2
+    q2q3 = q2*q3
+    q3q3 = q3*q3
+
+    # Reference direction of Earth's magnetic field, h = q * m * q'
+    hx = mx*(q0q0 + q1q1 - q2q2 - q3q3) + 2*my*(q1q2 - q0q3) + 2*mz*(q0q2 + q1q3)
+    hy = 2*mx*(q1q2 + q0q3) + my*(q0q0 - q1q1 + q2q2 - q3q3) + 2*mz*(q2q3 - q0q1)
+    hz = 2*mx*(q1q3 - q0q2) + 2*my*(q0q1 + q2q3) + mz*(q0q0 - q1q1 - q2q2 + q3q3)
+    _2bx = 2*math.sqrt(hx*hx + hy*hy)
+    _2bz = 2*hz
+
+    # Objective function f and Jacobian J of the gradient descent step
+    f0 = 2*(q1q3 - q0q2) - ax
+    f1 = 2*(q0q1 + q2q3) - ay
+    f2 = 1 - 2*(q1q1 + q2q2) - az
+    f3 = _2bx*(0.5 - q2q2 - q3q3) + _2bz*(q1q3 - q0q2) - mx
+    f4 = _2bx*(q1q2 - q0q3) + _2bz*(q0q1 + q2q3) - my
+    f5 = _2bx*(q0q2 + q1q3) + _2bz*(0.5 - q1q1 - q2q2) - mz
+
+    # step = J' * f
+    s0 = (-2*q2*f0 + 2*q1*f1
+          - _2bz*q2*f3 + (_2bz*q1 - _2bx*q3)*f4 + _2bx*q2*f5)
+    s1 = (2*q3*f0 + 2*q0*f1 - 4*q1*f2
+          + _2bz*q3*f3 + (_2bx*q2 + _2bz*q0)*f4 + (_2bx*q3 - 2*_2bz*q1)*f5)
+    s2 = (-2*q0*f0 + 2*q3*f1 - 4*q2*f2
+          - (2*_2bx*q2 + _2bz*q0)*f3 + (_2bx*q1 + _2bz*q3)*f4 + (_2bx*q0 - 2*_2bz*q2)*f5)
+    s3 = (2*q1*f0 + 2*q2*f1
+          + (_2bz*q1 - 2*_2bx*q3)*f3 + (_2bz*q2 - _2bx*q0)*f4 + _2bx*q1*f5)
+
+    _integrate(q, q0, q1, q2, q3, gx, gy, gz, s0, s1, s2, s3, beta, sample_period)
+
+
+def _integrate(q, q0, q1, q2, q3, gx, gy, gz, s0, s1, s2, s3, beta, sample_period):
+    # Normalize step magnitude, a zero step leaves only the gyroscope
+    n = math.sqrt(s0*s0 + s1*s1 + s2*s2 + s3*s3)
+    if n:
+        beta /= n
+
+    # Rate of change of quaternion, q * (0, gyroscope) / 2 - beta * step
+    dq0 = 0.5*(-q1*gx - q2*gy - q3*gz) - beta*s0
+    dq1 = 0.5*(q0*gx + q2*gz - q3*gy) - beta*s1
+    dq2 = 0.5*(q0*gy - q1*gz + q3*gx) - beta*s2
+    dq3 = 0.5*(q0*gz + q1*gy - q2*gx) - beta*s3
+
+    # Integrate to yield quaternion
+    q0 += dq0*sample_period
+    q1 += dq1*sample_period
+    q2 += dq2*sample_period
+    q3 += dq3*sample_period
+
+    # Normalize quaternion
+    n = math.sqrt(q0*q0 + q1*q1 + q2*q2 + q3*q3)
+    q[0] = q0/n
+    q[1] = q1/n
+    q[2] = q2/n
+    q[3] = q3/n
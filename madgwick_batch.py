@@ -0,0 +1,167 @@
+"""
+Host side Madgwick filter which updates many streams in lockstep with
+NumPy, for reprocessing decoded sessions. The filter is sequential per
+stream, so every update step runs the unrolled update of
+`madgwick_ahrs.update_9DOF_fast()` on `n_streams x 4` arrays at once.
+
+    >>> sessions = [session_reader.load(path) for path in glob.glob('sessions/*.bin')]
+    >>> orientations = madgwick_batch.process(sessions, beta=0.1)
+    >>> orientations[0].shape
+    (1200, 4)
+"""
+
+import numpy as np
+
+
+class MadgwickBatch:
+    """
+    Class which keeps the orientation of `n_streams` independent filters in
+    `quaternion`, an `n_streams x 4` array of w, x, y, z.
+    """
+
+    def __init__(self, n_streams, sample_period=1/256, quaternion=(1, 0, 0, 0), beta=0.041):
+        """
+        :param n_streams: Number of filters
+        :param sample_period: The sample period in seconds, a number or an
+            array with one period per stream
+        :param quaternion: Initial quaternion of every stream, or an
+            `n_streams x 4` array
+        :param beta: Algorithm gain beta
+        """
+        self.quaternion = np.array(np.broadcast_to(np.asarray(quaternion, dtype=np.float64), (n_streams, 4)))
+        self.sample_period = sample_period
+        self.beta = beta
+
+    def update_6DOF(self, gyroscope, accelerometer, sample_period=None, active=None):
+        """
+        Performs one update step of every stream with IMU data.
+        :param gyroscope: `n_streams x 3` array of gyroscope data in radians
+            per second
+        :param accelerometer: `n_streams x 3` array of accelerometer data.
+            Can be any unit since normalized values are used.
+        :param sample_period: Overrides `sample_period` for this step
+        :param active: Boolean array of the streams to update, all if None
+        """
+        self.update_9DOF(gyroscope, accelerometer, None, sample_period, active)
+
+    def update_9DOF(self, gyroscope, accelerometer, magnetometer, sample_period=None, active=None):
+        """
+        Performs one update step of every stream with AHRS data. Streams with
+        a zero magnetometer reading fall back to the IMU update, streams with
+        a zero accelerometer reading are left unchanged.
+        :param gyroscope: `n_streams x 3` array of gyroscope data in radians
+            per second
+        :param accelerometer: `n_streams x 3` array of accelerometer data.
+            Can be any unit since normalized values are used.
+        :param magnetometer: `n_streams x 3` array of magnetometer data, or
+            None for the IMU update. Can be any unit since normalized values
+            are used.
+        :param sample_period: Overrides `sample_period` for this step
+        :param active: Boolean array of the streams to update, all if None
+        """
+        q = self.quaternion
+        q0, q1, q2, q3 = q.T
+        gx, gy, gz = np.asarray(gyroscope, dtype=np.float64).T
+
+        # Normalize accelerometer measurement
+        ax, ay, az, accel_ok = _normalized(accelerometer)
+
+        # Objective function f and Jacobian J of the gradient descent step
+        f0 = 2*(q1*q3 - q0*q2) - ax
+        f1 = 2*(q0*q1 + q2*q3) - ay
+        f2 = 1 - 2*(q1*q1 + q2*q2) - az
+
+        # step = J' * f
+        s0 = -2*q2*f0 + 2*q1*f1
+        s1 = 2*q3*f0 + 2*q0*f1 - 4*q1*f2
+        s2 = -2*q0*f0 + 2*q3*f1 - 4*q2*f2
+        s3 = 2*q1*f0 + 2*q2*f1
+
+        if magnetometer is not None:
+            # Normalize magnetometer measurement
+            mx, my, mz, mag_ok = _normalized(magnetometer)
+
+            # Reference direction of Earth's magnetic field, h = q * m * q'
+            hx = mx*(q0*q0 + q1*q1 - q2*q2 - q3*q3) + 2*my*(q1*q2 - q0*q3) + 2*mz*(q0*q2 + q1*q3)
+            hy = 2*mx*(q1*q2 + q0*q3) + my*(q0*q0 - q1*q1 + q2*q2 - q3*q3) + 2*mz*(q2*q3 - q0*q1)
+            hz = 2*mx*(q1*q3 - q0*q2) + 2*my*(q0*q1 + q2*q3) + mz*(q0*q0 - q1*q1 - q2*q2 + q3*q3)
+            _2bx = 2*np.sqrt(hx*hx + hy*hy)
+            _2bz = 2*hz
+
+            f3 = _2bx*(0.5 - q2*q2 - q3*q3) + _2bz*(q1*q3 - q0*q2) - mx
+            f4 = _2bx*(q1*q2 - q0*q3) + _2bz*(q0*q1 + q2*q3) - my
+            f5 = _2bx*(q0*q2 + q1*q3) + _2bz*(0.5 - q1*q1 - q2*q2) - mz
+
+            # Magnetometer rows of J' * f, zero for streams without a reading
+            s0 = s0 + mag_ok*(-_2bz*q2*f3 + (_2bz*q1 - _2bx*q3)*f4 + _2bx*q2*f5)
+            s1 = s1 + mag_ok*(_2bz*q3*f3 + (_2bx*q2 + _2bz*q0)*f4 + (_2bx*q3 - 2*_2bz*q1)*f5)
+            s2 = s2 + mag_ok*(-(2*_2bx*q2 + _2bz*q0)*f3 + (_2bx*q1 + _2bz*q3)*f4 + (_2bx*q0 - 2*_2bz*q2)*f5)
+            s3 = s3 + mag_ok*((_2bz*q1 - 2*_2bx*q3)*f3 + (_2bz*q2 - _2bx*q0)*f4 + _2bx*q1*f5)
+
+        # Normalize step magnitude, a zero step leaves only the gyroscope
+        n = np.sqrt(s0*s0 + s1*s1 + s2*s2 + s3*s3)
+        gain = self.beta / np.where(n > 0, n, 1)
+
+        # Rate of change of quaternion, q * (0, gyroscope) / 2 - beta * step
+        dq = np.empty_like(q)
+        dq[:, 0] = 0.5*(-q1*gx - q2*gy - q3*gz) - gain*s0
+        dq[:, 1] = 0.5*(q0*gx + q2*gz - q3*gy) - gain*s1
+        dq[:, 2] = 0.5*(q0*gy - q1*gz + q3*gx) - gain*s2
+        dq[:, 3] = 0.5*(q0*gz + q1*gy - q2*gx) - gain*s3
+
+        # Integrate to yield quaternion
+        if sample_period is None:
+            sample_period = self.sample_period
+        dq *= np.reshape(sample_period, (-1, 1))
+        dq += q
+        dq /= np.linalg.norm(dq, axis=1, keepdims=True)  # normalize quaternion
+
+        update = accel_ok if active is None else accel_ok & active
+        self.quaternion = np.where(update[:, None], dq, q)
+
+
+def _normalized(v):
+    v = np.asarray(v, dtype=np.float64)
+    n = np.linalg.norm(v, axis=1)
+    ok = n > 0
+    v = v / np.where(ok, n, 1)[:, None]
+    return v[:, 0], v[:, 1], v[:, 2], ok
+
+
+def process(sessions, beta=0.041, quaternion=(1, 0, 0, 0), magnetometer=True):
+    """
+    Runs a filter over every session in lockstep.
+    :param sessions: Decoded sessions, see `session_reader.decode()`. Sample
+        periods come from each session's `time`.
+    :param beta: Algorithm gain beta
+    :param quaternion: Initial quaternion of every session
+    :param magnetometer: Use the magnetometer data (9DOF), otherwise only the
+        gyroscope and accelerometer (6DOF)
+    :return: List of `n x 4` orientation arrays, one per session
+    """
+    lengths = np.array([len(session) for session in sessions])
+    steps = int(lengths.max()) if len(sessions) else 0
+
+    # Time major so every step reads contiguous n_streams x 3 slices,
+    # streams that have ended are padded and left inactive
+    gyro = np.zeros((steps, len(sessions), 3))
+    acceleration = np.zeros((steps, len(sessions), 3))
+    magnetic = np.zeros((steps, len(sessions), 3))
+    periods = np.zeros((steps, len(sessions)))
+    for i, session in enumerate(sessions):
+        n = lengths[i]
+        gyro[:n, i] = session.gyro
+        acceleration[:n, i] = session.acceleration
+        magnetic[:n, i] = session.magnetic
+        if n:
+            periods[0, i] = session.sample_period
+            periods[1:n, i] = np.diff(session.time)
+
+    engine = MadgwickBatch(len(sessions), quaternion=quaternion, beta=beta)
+    orientations = np.empty((steps, len(sessions), 4))
+    for step in range(steps):
+        engine.update_9DOF(gyro[step], acceleration[step], magnetic[step] if magnetometer else None,
+                           periods[step], step < lengths)
+        orientations[step] = engine.quaternion
+
+    return [orientations[:n, i] for i, n in enumerate(lengths)]
@@ -1,13 +1,24 @@
 import os
 import sys
-import select
 import machine
-import ustruct
+import uasyncio
 import utime
+import commands
 import mpu9250
+import sample_core
+import sample_fifo
+import sample_ring
+import transfer
 
 from ak8963 import AK8963
+from button import Button
+from gc_policy import GcPolicy
+from loop_stats import LoopStats
 from mpu6500 import MPU6500
+from sample_clock import SampleClock
+from session_format import RECORD_FLOAT32, RECORD_RAW, FLAG_TIMESTAMPS, FLAG_FOOTER, FLAG_DELTA
+from session_index import SessionIndex
+from session_writer import SessionWriter, to_base64
 
 # ---------- OPTIONS ---------- #
 SAMPLE_FREQ = 20
@@ -22,33 +33,38 @@ DEBUG_LED = machine.Pin(25, machine.Pin.OUT)
 STATUS_LED.value(1)  # test
 utime.sleep(1)  # test
 STATUS_LED.value(0)
-BUTTON_HANG = 0.5
+BUTTON_DEBOUNCE_MS = 50
 
 FILE_DEBUGGING = False
+# log unscaled register values, conversion is done on the host
+RAW_CAPTURE = True
+# delta compress raw records, about half the flash and transfer time, see
+# delta_encoder.py
+DELTA_COMPRESSION = True
+# 'poll' samples in the capture loop, 'timer' from a machine.Timer and 'drdy'
+# from the MPU6500 data ready interrupt on MPU_INT, both into a ring buffer,
+# 'fifo' from the MPU6500 hardware FIFO, 'core1' on the second core into a
+# double buffer. The buffered modes are drained to flash every DRAIN_MS and
+# always log raw.
+ACQUISITION = 'poll'
+MPU_INT = machine.Pin(16, machine.Pin.IN)
+# records buffered by the 'timer', 'drdy' and 'core1' modes
+RING_SLOTS = 256
+DRAIN_MS = 50
+# no automatic garbage collection during a capture, collect after every
+# block written to flash instead, see gc_policy.py
+CONTROLLED_GC = True
 # ----------------------------- #
 
-alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
-
 
 def get_size(filename):
     return os.stat(filename)[6]
 
 
-def to_base64(num):
-    lst = []
-    while num:
-        lst.append(num % 64)
-        num = num//64
-
-    res = ''
-    for n in lst[::-1]:
-        res += alphabet[n]
-
-    while len(res) < 12:
-        res = 'A'+res
-
-    return res
-
+# AK8963 axes are aligned to the MPU6500 ones by swapping X and Y and
+# flipping Z
+MAGNO_AXIS_MAP = (1, 0, 2)
+MAGNO_AXIS_SIGN = (1, 1, -1)
 
 PRAJWAL_MAGNO_OFFSET = (29.04609, 34.06641, -52.03125)
 SUSHRUT_MAGNO_OFFSET = (3.153517, 26.01416, -29.99121)
@@ -79,91 +95,229 @@ try:
 except OSError:
     magno = AK8963(i2c, offset=MAGNO_OFFSET, scale=MAGNO_SCALE)
 
-sensor = mpu9250.MPU9250(i2c, ak8963=magno, mpu6500=mpu6500)
+sensor = mpu9250.MPU9250(i2c, ak8963=magno, mpu6500=mpu6500,
+                         mag_axis_map=MAGNO_AXIS_MAP, mag_axis_sign=MAGNO_AXIS_SIGN)
+
+try:
+    os.stat("./sessions")
+except OSError:
+    os.mkdir("./sessions")
+
+index = SessionIndex('./sessions', './sessions.json')
+index.refresh()
+
+button = Button(START_STOP_BUTTON, BUTTON_DEBOUNCE_MS)
+
+# 'idle', 'armed' (waiting for the calibration press) or 'capturing'
+state = 'idle'
+# last or current session
+session_name = None
+writer = None
+# SampleClock, SampleRing, SampleFifo or SampleCore of the last or current session
+source = None
+# LoopStats of the last or current polled session
+loop_stats = None
+# GcPolicy of the last or current session if CONTROLLED_GC
+gc_policy = None
 
 
-while True:
-    # not logging, checking if connected to app
-    while START_STOP_BUTTON.value() != 1:
+@commands.command('flash')
+async def flash(args):
+    for i in range(10):  # DEBUG
         DEBUG_LED.value(1)
-        utime.sleep(0.1)
+        # STATUS_LED.value(1)
+        await uasyncio.sleep_ms(100)
         DEBUG_LED.value(0)
-        utime.sleep(0.1)
-        # NOTE: inefficient, consider porting to select.poll()
-        if select.select([sys.stdin], [], [], 0)[0]:
-            msg = sys.stdin.readline().rstrip('\n')
-            if msg == 'flash':
-                for i in range(10):  # DEBUG
-                    DEBUG_LED.value(1)
-                    # STATUS_LED.value(1)
-                    utime.sleep(0.1)
-                    DEBUG_LED.value(0)
-                    # STATUS_LED.value(0)
-                    utime.sleep(0.1)
-                sys.stdout.write("done")
-            elif msg == 'calibmag':
-                with open('magno_offset.txt', 'w') as f:
-                    calib_data = magno.calibrate()
-                    calib_data = calib_data[0] + calib_data[1]
-                    f.write(' '.join(map(str, calib_data)))
-                sensor = mpu9250.MPU9250(i2c, ak8963=magno, mpu6500=mpu6500)
-            elif msg == 'issetup':
-                if 'magno_offset.txt' in os.listdir():
-                    sys.stdout.write("true")
-                else:
-                    sys.stdout.write("false")
-            elif msg == 'sendfiles':
-                STATUS_LED.value(1)
-                utime.sleep(0.5)
-                STATUS_LED.value(0)
-                session_files = []
-                try:
-                    os.stat("./sessions")
-                except OSError:
-                    os.mkdir("./sessions")
-                for fname in os.listdir('./sessions'):
-                    if get_size(f'./sessions/{fname}'):
-                        session_files.append(fname)
-                    else:
-                        os.remove(f'./sessions/{fname}')
-                    # try:
-                    #     with open(fname, 'r') as f:
-                    #         data = f.read()
-                    #         if data:
-                    #             sys.stdout.write(fname[:-4])  # session timestamp
-                    #             sys.stdout.write(data)    # session data
-                    # except Exception as err:
-                    #     try:
-                    #         sys.stdout.write(data)
-                    #         sys.stdout.write(fname)
-                    #         sys.stdout.write(err)
-                    #     except NameError:
-                    #         print("'data' was not defined")
-                sys.stdout.write(str(len(session_files))+'\n')
-                for fname in session_files:
-                    with open(f'./sessions/{fname}', 'r') as f:
-                        data = f.read()
-                        sys.stdout.write(fname[:-4]+'\n')  # session timestamp
-                        sys.stdout.write(data+'\n')  # session data
-                    os.remove(f'./sessions/{fname}')
+        # STATUS_LED.value(0)
+        await uasyncio.sleep_ms(100)
+    sys.stdout.write("done")
+
+
+@commands.command('calibmag')
+def calibmag(args):
+    global sensor
+    if state == 'capturing':
+        sys.stdout.write('busy\n')
+        return
+    with open('magno_offset.txt', 'w') as f:
+        calib_data = magno.calibrate()
+        calib_data = calib_data[0] + calib_data[1]
+        f.write(' '.join(map(str, calib_data)))
+    sensor = mpu9250.MPU9250(i2c, ak8963=magno, mpu6500=mpu6500,
+                             mag_axis_map=MAGNO_AXIS_MAP, mag_axis_sign=MAGNO_AXIS_SIGN)
+
+
+@commands.command('issetup')
+def issetup(args):
+    if 'magno_offset.txt' in os.listdir():
+        sys.stdout.write("true")
+    else:
+        sys.stdout.write("false")
+
 
+@commands.command('sendfiles')
+def sendfiles(args):
+    # sendfiles [bin]
+    if state == 'capturing':
+        sys.stdout.write('busy\n')
+        return
     STATUS_LED.value(1)
-    print('waiting for calib')  # DEBUG
+    utime.sleep(0.5)
+    STATUS_LED.value(0)
+    session_files = []
+    for fname in os.listdir('./sessions'):
+        if get_size(f'./sessions/{fname}'):
+            session_files.append(fname)
+        else:
+            os.remove(f'./sessions/{fname}')
+    # chunked and checksummed, files are deleted once the host acks them
+    transfer.send_sessions('./sessions', session_files, sys.stdout, sys.stdin,
+                           binary=args == ['bin'])
+    index.refresh()
+
+
+@commands.command('ls')
+def ls(args):
+    # <name> <size> <samples> <crc32> <transferred> per session
+    sys.stdout.write(f'{len(index.sessions)}\n')
+    for fname, (size, samples, crc, transferred) in index.sessions.items():
+        sys.stdout.write(f'{fname} {size} {samples} {crc:08x} {int(transferred)}\n')
+
+
+@commands.command('get')
+def get(args):
+    # get <name> <offset> <length>, sent as binary frames, sending blocks
+    # the capture so it is refused while capturing
+    if state == 'capturing':
+        sys.stdout.write('busy\n')
+    elif len(args) == 3 and args[0] in index.sessions:
+        transfer.send_range(f'./sessions/{args[0]}', args[0], int(args[1]), int(args[2]), sys.stdout.buffer)
+    else:
+        sys.stdout.write('error\n')
 
-    utime.sleep(BUTTON_HANG)
 
-    while START_STOP_BUTTON.value() != 1:
-        continue
+@commands.command('done')
+def done(args):
+    # marks a session as downloaded, it is deleted before the next recording
+    sys.stdout.write('ok\n' if args and index.mark_transferred(args[0]) else 'error\n')
 
-    mpu6500.calibrate()
-    print('calibrated')
 
-    STATUS_LED.value(0)
+@commands.command('help')
+def help_(args):
+    sys.stdout.write(' '.join(commands.names()) + '\n')
+
 
+def lost(source):
+    # samples lost by the running capture, missed deadlines or buffer overflows
+    return getattr(source, 'missed', 0) + getattr(source, 'overflows', 0)
+
+
+@commands.command('status')
+def status(args):
+    # <state> [<session> <records> <bytes written> <lost samples>]
+    if writer is None:
+        sys.stdout.write(f'{state}\n')
+    else:
+        sys.stdout.write(f'{state} {session_name} {writer.records} {writer.bytes_written} {lost(source)}\n')
+
+
+@commands.command('stats')
+def stats(args):
+    # <phase> <count> <min> <max> <p99> per capture loop phase in us, then
+    # overruns <n>, gc <n> and missed <n>, see loop_stats.py, then
+    # mem <low water> <high water> <collections> <worst collect us>
+    if loop_stats is None and gc_policy is None:
+        sys.stdout.write('none\n')
+        return
+    if loop_stats is not None:
+        for line in loop_stats.lines():
+            sys.stdout.write(line + '\n')
+        sys.stdout.write(f'missed {lost(source)}\n')
+    if gc_policy is not None:
+        sys.stdout.write(f'mem {gc_policy.low_water} {gc_policy.high_water} '
+                         f'{gc_policy.collections} {gc_policy.worst_collect_us}\n')
+
+
+async def status_leds():
+    # idle: blinking debug LED, armed: status LED on, capturing: both off
+    while True:
+        STATUS_LED.value(state == 'armed')
+        DEBUG_LED.value(state == 'idle' and not DEBUG_LED.value())
+        await uasyncio.sleep_ms(100)
+
+
+async def stop_on_press(stop):
+    await button.pressed()
+    stop.set()
+
+
+async def sample_poll(stop):
+    # samples in this task at absolute deadlines, other tasks run in between,
+    # the phases of every iteration are timed into loop_stats
+    global source, loop_stats
+    source = clock = SampleClock(SAMPLE_FREQ)
+    loop_stats = LoopStats(clock.period_us, gc_policy)
+    ticks_us = utime.ticks_us
+    flushes = writer.flushes
+    if gc_policy is not None:
+        gc_policy.start(writer)
     try:
-        os.stat("./sessions")
-    except OSError:
-        os.mkdir("./sessions")
+        while not stop.is_set():
+            elapsed = await clock.wait_async()
+            start = ticks_us()
+            if RAW_CAPTURE:
+                writer.read_raw()
+                read = ticks_us()
+                writer.stamp(elapsed)
+            else:
+                acceleration, gyro, _ = sensor.read_motion()
+                magnetic = sensor.magnetic
+                read = ticks_us()
+                writer.encode(gyro, acceleration, magnetic, elapsed)
+            encoded = ticks_us()
+            writer.commit()
+            loop_stats.add(start, read, encoded, ticks_us())
+            if gc_policy is not None:
+                gc_policy.after_write(writer)
+            elif writer.flushes != flushes:
+                flushes = writer.flushes
+                loop_stats.block_written()
+    finally:
+        if gc_policy is not None:
+            gc_policy.stop()
+
+
+async def sample_debug(stop, testfile):
+    global source
+    source = clock = SampleClock(SAMPLE_FREQ)
+    while not stop.is_set():
+        elapsed = await clock.wait_async()
+        acceleration, gyro, _ = sensor.read_motion()
+        magnetic = sensor.magnetic
+        writer.write(gyro, acceleration, magnetic, elapsed)
+        # packed 40 byte record with timestamp (little-endian) as 56 base64
+        # characters, decode with session_reader.from_base64
+        testfile.write(f"{repr(gyro + acceleration + magnetic)} {str(list(writer.record))} {to_base64(writer.record)}\n")
+
+
+async def drain(stop, buffer):
+    # flash writer task of the interrupt and FIFO driven modes
+    if gc_policy is not None:
+        gc_policy.start(writer)
+    try:
+        while not stop.is_set():
+            buffer.drain(writer)
+            if gc_policy is not None:
+                gc_policy.after_write(writer)
+            await uasyncio.sleep_ms(DRAIN_MS)
+    finally:
+        if gc_policy is not None:
+            gc_policy.stop()
+
+
+async def capture():
+    global session_name, writer, source, gc_policy
+    index.prune()
 
     if FILE_DEBUGGING:
         try:
@@ -171,32 +325,86 @@ while True:
         except OSError:
             os.mkdir("./test-sessions")
 
-    max_file_num = 0
-    for fname in os.listdir('./sessions'):
-        if fname.endswith('.txt'):
-            max_file_num = max(max_file_num, int(fname[:-4]))
-
-    if FILE_DEBUGGING:
-        with open(f'./sessions/{max_file_num+1}.txt', 'w') as logfile, open(f'./test-sessions/{max_file_num+1}.txt', 'w') as testfile:
-            while START_STOP_BUTTON.value() != 1:
-                # 4 bytes per number (little-endian) that are converted to base-64
-                reading = sensor.gyro + sensor.acceleration + \
-                    (sensor.magnetic[1], sensor.magnetic[0], -sensor.magnetic[2])
-                s = ustruct.pack('<' + 'f' * 9, *reading)
-                num = int.from_bytes(s, 'big')
-                num_base64 = to_base64(num)
-                logfile.write(num_base64)
-                testfile.write(f"{repr(reading)} {str(list(s))} {str(num)} {num_base64}\n")
-                utime.sleep(1/SAMPLE_FREQ)
-    else:
-        with open(f'./sessions/{max_file_num+1}.txt', 'w') as logfile:
-            while START_STOP_BUTTON.value() != 1:
-                # 4 bytes per number (little-endian) that are converted to base-64
-                # logfile.write(to_base64(int.from_bytes(ustruct.pack('<'+'f'*9, *(sensor.gyro+sensor.acceleration
-                #                                                                  + (sensor.magnetic[1], sensor.magnetic[0], -sensor.magnetic[2]))), 'big')))
-                for val in sensor.gyro+sensor.acceleration + (sensor.magnetic[1], sensor.magnetic[0], -sensor.magnetic[2]):
-                    logfile.write(str(val)+' ')
-                utime.sleep(1/SAMPLE_FREQ)
-
-    # NOTE: Consider changing hang time
-    utime.sleep(BUTTON_HANG)  # so that one button press is not counted as multiple
+    session_name = index.next_name()
+    delta = FLAG_DELTA if DELTA_COMPRESSION else 0
+    stop = uasyncio.Event()
+    uasyncio.create_task(stop_on_press(stop))
+    # sample_poll and drain run the collections, sample_debug leaves them to the GC
+    gc_policy = GcPolicy() if CONTROLLED_GC and not FILE_DEBUGGING else None
+
+    # binary session log, see session_format.py
+    with open(f'./sessions/{session_name}', 'wb') as logfile:
+        if FILE_DEBUGGING:
+            with open(f'./test-sessions/{session_name[:-4]}.txt', 'w') as testfile:
+                writer = SessionWriter(logfile, sensor, SAMPLE_FREQ, flags=FLAG_TIMESTAMPS)
+                await sample_debug(stop, testfile)
+        elif ACQUISITION == 'fifo':
+            writer = SessionWriter(logfile, sensor, SAMPLE_FREQ,
+                                   record_format=sample_fifo.RECORD_FORMAT, flags=sample_fifo.FLAGS | delta)
+            source = sample_fifo.SampleFifo(sensor, SAMPLE_FREQ)
+            source.start()
+            await drain(stop, source)
+            source.drain(writer)
+            source.stop()
+            print('high water', source.high_water)  # DEBUG
+        elif ACQUISITION == 'core1':
+            writer = SessionWriter(logfile, sensor, SAMPLE_FREQ,
+                                   record_format=sample_core.RECORD_FORMAT, flags=sample_core.FLAGS | delta)
+            source = sample_core.SampleCore(sensor, SAMPLE_FREQ, RING_SLOTS)
+            source.start()
+            await drain(stop, source)
+            await source.stop_async()
+            source.drain(writer)
+            print('high water', source.high_water)  # DEBUG
+        elif ACQUISITION != 'poll':
+            writer = SessionWriter(logfile, sensor, SAMPLE_FREQ,
+                                   record_format=sample_ring.RECORD_FORMAT, flags=sample_ring.FLAGS | delta)
+            source = sample_ring.SampleRing(sensor, RING_SLOTS)
+            if ACQUISITION == 'drdy':
+                mpu6500.set_sample_rate(1000 // SAMPLE_FREQ - 1)
+                mpu6500.data_ready_interrupt()
+                source.start_data_ready(MPU_INT)
+            else:
+                source.start_timer(SAMPLE_FREQ)
+            await drain(stop, source)
+            source.stop()
+            mpu6500.data_ready_interrupt(False)
+            source.drain(writer)
+            print('high water', source.high_water)  # DEBUG
+        else:
+            writer = SessionWriter(logfile, sensor, SAMPLE_FREQ, record_format=RECORD_RAW if RAW_CAPTURE else RECORD_FLOAT32,
+                                   flags=FLAG_TIMESTAMPS | FLAG_FOOTER | (delta if RAW_CAPTURE else 0))
+            await sample_poll(stop)
+            writer.write_footer(loop_stats.pack(source.missed))
+        writer.flush()
+        print('lost', lost(source), 'samples')  # DEBUG
+        print('wrote', writer.bytes_written, 'bytes in', writer.flushes, 'blocks, worst',
+              writer.worst_flush_us, 'us')  # DEBUG
+        if gc_policy is not None:
+            print('free', gc_policy.low_water, 'to', gc_policy.high_water, 'bytes,',
+                  gc_policy.collections, 'collections, worst', gc_policy.worst_collect_us, 'us')  # DEBUG
+
+    index.add(session_name, writer.bytes_written, writer.records, writer.crc)
+
+
+async def run():
+    global state
+    # commands are served in every state, eg. status during a match
+    uasyncio.create_task(commands.serve())
+    uasyncio.create_task(status_leds())
+    while True:
+        state = 'idle'
+        await button.pressed()
+
+        state = 'armed'
+        print('waiting for calib')  # DEBUG
+        await button.pressed()
+
+        mpu6500.calibrate()
+        print('calibrated')
+
+        state = 'capturing'
+        await capture()
+
+
+uasyncio.run(run())
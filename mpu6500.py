@@ -33,10 +33,15 @@ import utime
 from micropython import const
 # pylint: enable=import-error
 
+_SMPLRT_DIV = const(0x19)
+_CONFIG = const(0x1a)
 _GYRO_CONFIG = const(0x1b)
 _ACCEL_CONFIG = const(0x1c)
 _ACCEL_CONFIG2 = const(0x1d)
+_FIFO_EN = const(0x23)
 _INT_PIN_CFG = const(0x37)
+_INT_ENABLE = const(0x38)
+_INT_STATUS = const(0x3a)
 _ACCEL_XOUT_H = const(0x3b)
 _ACCEL_XOUT_L = const(0x3c)
 _ACCEL_YOUT_H = const(0x3d)
@@ -51,6 +56,10 @@ _GYRO_YOUT_H = const(0x45)
 _GYRO_YOUT_L = const(0x46)
 _GYRO_ZOUT_H = const(0x47)
 _GYRO_ZOUT_L = const(0x48)
+_USER_CTRL = const(0x6a)
+_FIFO_COUNTH = const(0x72)
+_FIFO_COUNTL = const(0x73)
+_FIFO_R_W = const(0x74)
 _WHO_AM_I = const(0x75)
 
 #_ACCEL_FS_MASK = const(0b00011000)
@@ -75,6 +84,30 @@ _GYRO_SO_500DPS = 62.5
 _GYRO_SO_1000DPS = 32.8
 _GYRO_SO_2000DPS = 16.4
 
+# Gyro and temperature low pass filter bandwidths, SMPLRT_DIV is only used
+# when one of these is selected
+DLPF_CFG_184HZ = const(0b00000001)
+DLPF_CFG_92HZ = const(0b00000010)
+DLPF_CFG_41HZ = const(0b00000011)
+DLPF_CFG_20HZ = const(0b00000100)
+DLPF_CFG_10HZ = const(0b00000101)
+DLPF_CFG_5HZ = const(0b00000110)
+
+_RAW_RDY_EN = const(0b00000001)
+
+# Stop writing to the FIFO when full instead of overwriting oldest samples
+_FIFO_MODE_STOP = const(0b01000000)
+# Temperature, gyro X, Y, Z and accel FIFO enable bits
+_FIFO_EN_MOTION = const(0b11111000)
+_USER_CTRL_FIFO_EN = const(0b01000000)
+_USER_CTRL_FIFO_RST = const(0b00000100)
+_FIFO_OFLOW_INT = const(0b00010000)
+
+FIFO_SIZE = const(512)
+# Samples are stored in register order, ie. the same 14 bytes as read by
+# `read_raw_into()`
+FIFO_SAMPLE_SIZE = const(14)
+
 _TEMP_SO = 333.87
 _TEMP_OFFSET = 21
 
@@ -165,6 +198,116 @@ class MPU6500:
         """ Value of the whoami register. """
         return self._register_char(_WHO_AM_I)
 
+    def read_all(self):
+        """
+        Acceleration, gyro and die temperature from a single 14 byte burst
+        read of the output registers, so all values come from the same
+        sample. Returns a 3-tuple of (acceleration, gyro, temperature) scaled
+        the same way as the `acceleration`, `gyro` and `temperature`
+        properties.
+        """
+        ax, ay, az, temp, gx, gy, gz = self._register_seven_shorts(_ACCEL_XOUT_H)
+
+        so = self._accel_so
+        sf = self._accel_sf
+        ox, oy, oz = self._accel_offset
+        acceleration = (ax / so * sf - ox, ay / so * sf - oy, az / so * sf - oz)
+
+        so = self._gyro_so
+        sf = self._gyro_sf
+        ox, oy, oz = self._gyro_offset
+        gyro = (gx / so * sf - ox, gy / so * sf - oy, gz / so * sf - oz)
+
+        temperature = ((temp - _TEMP_OFFSET) / _TEMP_SO) + _TEMP_OFFSET
+
+        return acceleration, gyro, temperature
+
+    def read_raw_into(self, buf):
+        """
+        Reads the 14 output registers from ACCEL_XOUT_H to GYRO_ZOUT_L into
+        `buf` as they are, ie. big-endian accel X, Y, Z, temperature and
+        gyro X, Y, Z counts. No scaling or offsets are applied.
+        """
+        self.i2c.readfrom_mem_into(self.address, _ACCEL_XOUT_H, buf)
+
+    def set_sample_rate(self, rate_div, dlpf=DLPF_CFG_41HZ):
+        """
+        Sets the output data rate to 1 kHz / (1 + `rate_div`) and the gyro
+        low pass filter to `dlpf`, one of the `DLPF_CFG_*` values. The data
+        ready interrupt fires at this rate.
+        """
+        self._register_char(_CONFIG, dlpf | _FIFO_MODE_STOP)
+        self._register_char(_SMPLRT_DIV, rate_div)
+
+    def data_ready_interrupt(self, enable=True):
+        """
+        Enables or disables a pulse on the INT pin for every new sample.
+        """
+        self._register_char(_INT_ENABLE, _RAW_RDY_EN if enable else 0)
+
+    def fifo_enable(self, enable=True):
+        """
+        Starts or stops buffering samples in the on-chip FIFO at the rate
+        set with `set_sample_rate()`. Each sample is `FIFO_SAMPLE_SIZE`
+        bytes laid out like `read_raw_into()`. Enabling clears the FIFO.
+        """
+        self._register_char(_FIFO_EN, 0)
+        user_ctrl = self._register_char(_USER_CTRL) & ~_USER_CTRL_FIFO_EN
+        self._register_char(_USER_CTRL, user_ctrl | _USER_CTRL_FIFO_RST)
+        if enable:
+            self._register_char(_USER_CTRL, user_ctrl | _USER_CTRL_FIFO_EN)
+            self._register_char(_FIFO_EN, _FIFO_EN_MOTION)
+
+    @property
+    def fifo_count(self):
+        """
+        Number of bytes in the FIFO.
+        """
+        return self._register_short(_FIFO_COUNTH) & 0x1fff
+
+    @property
+    def fifo_overflow(self):
+        """
+        True if the FIFO filled up and samples were lost since the last
+        check. Reading clears the flag.
+        """
+        return bool(self._register_char(_INT_STATUS) & _FIFO_OFLOW_INT)
+
+    def read_fifo_into(self, buf):
+        """
+        Reads as many whole samples as are available and fit into `buf`
+        with a single burst read of FIFO_R_W.
+        :return: The number of samples read
+        """
+        count = min(self.fifo_count, len(buf)) // FIFO_SAMPLE_SIZE
+        if count:
+            self.i2c.readfrom_mem_into(self.address, _FIFO_R_W, memoryview(buf)[:count * FIFO_SAMPLE_SIZE])
+        return count
+
+    def read_fifo(self, buf=bytearray(FIFO_SIZE)):
+        """
+        Reads and decodes all available FIFO samples. Returns a list of
+        (acceleration, gyro, temperature) tuples scaled like `read_all()`,
+        oldest first.
+        """
+        count = self.read_fifo_into(buf)
+        aso = self._accel_so
+        asf = self._accel_sf
+        aox, aoy, aoz = self._accel_offset
+        gso = self._gyro_so
+        gsf = self._gyro_sf
+        gox, goy, goz = self._gyro_offset
+
+        samples = []
+        for i in range(count):
+            ax, ay, az, temp, gx, gy, gz = ustruct.unpack_from(">hhhhhhh", buf, i * FIFO_SAMPLE_SIZE)
+            samples.append((
+                (ax / aso * asf - aox, ay / aso * asf - aoy, az / aso * asf - aoz),
+                (gx / gso * gsf - gox, gy / gso * gsf - goy, gz / gso * gsf - goz),
+                ((temp - _TEMP_OFFSET) / _TEMP_SO) + _TEMP_OFFSET
+            ))
+        return samples
+
     def calibrate(self, count=256, delay=0):
         gox, goy, goz = (0.0, 0.0, 0.0)
         aox, aoy, aoz = (0.0, 0.0, 0.0)
@@ -175,12 +318,11 @@ class MPU6500:
         while count:
             utime.sleep_ms(delay)
 
-            gx, gy, gz = self.gyro
+            (ax, ay, az), (gx, gy, gz), _ = self.read_all()
             gox += gx
             goy += gy
             goz += gz
 
-            ax, ay, az = self.acceleration
             aox += ax
             aoy += ay
             aoz += az
@@ -220,12 +362,16 @@ class MPU6500:
         self.i2c.readfrom_mem_into(self.address, register, buf)
         return ustruct.unpack(">hhh", buf)
 
+    def _register_seven_shorts(self, register, buf=bytearray(14)):
+        self.i2c.readfrom_mem_into(self.address, register, buf)
+        return ustruct.unpack(">hhhhhhh", buf)
+
     def _register_char(self, register, value=None, buf=bytearray(1)):
         if value is None:
             self.i2c.readfrom_mem_into(self.address, register, buf)
             return buf[0]
 
-        ustruct.pack_into("<b", buf, 0, value)
+        ustruct.pack_into("<B", buf, 0, value)
         return self.i2c.writeto_mem(self.address, register, buf)
 
     def _accel_fs(self, value):
@@ -40,7 +40,16 @@ _I2C_BYPASS_DIS = const(0b00000000)
 
 class MPU9250:
     """Class which provides interface to MPU9250 9-axis motion tracking device."""
-    def __init__(self, i2c, mpu6500 = None, ak8963 = None):
+    def __init__(
+        self, i2c, mpu6500 = None, ak8963 = None,
+        mag_axis_map=(0, 1, 2), mag_axis_sign=(1, 1, 1)
+    ):
+        # Magnetometer axes are remapped once per reading, ie. X, Y, Z of
+        # `magnetic` are AK8963 axes `mag_axis_map` multiplied by
+        # `mag_axis_sign`.
+        self._mag_axis_map = mag_axis_map
+        self._mag_axis_sign = mag_axis_sign
+
         if mpu6500 is None:
             self.mpu6500 = MPU6500(i2c)
         else:
@@ -85,14 +94,37 @@ class MPU9250:
     @property
     def magnetic(self):
         """
-        X, Y, Z axis micro-Tesla (uT) as floats.
+        X, Y, Z axis micro-Tesla (uT) as floats. Values come from a single
+        AK8963 reading remapped with `mag_axis_map` and `mag_axis_sign`
+        constructor parameters. For example `mag_axis_map=(1, 0, 2)` and
+        `mag_axis_sign=(1, 1, -1)` align the AK8963 axes with the MPU6500
+        accelerometer and gyro axes.
         """
-        return self.ak8963.magnetic
+        xyz = self.ak8963.magnetic
+        ix, iy, iz = self._mag_axis_map
+        sx, sy, sz = self._mag_axis_sign
+        return (xyz[ix] * sx, xyz[iy] * sy, xyz[iz] * sz)
 
     @property
     def whoami(self):
         return self.mpu6500.whoami
 
+    def read_motion(self):
+        """
+        Acceleration, gyro and die temperature read in one I2C transaction.
+        Returns a 3-tuple of (acceleration, gyro, temperature), see
+        `MPU6500.read_all()`.
+        """
+        return self.mpu6500.read_all()
+
+    def read_raw_into(self, motion_buf, mag_buf):
+        """
+        Reads unscaled register values, see `MPU6500.read_raw_into()` and
+        `AK8963.read_raw_into()`. Axis remapping is not applied.
+        """
+        self.mpu6500.read_raw_into(motion_buf)
+        self.ak8963.read_raw_into(mag_buf)
+
     def __enter__(self):
         return self
 
@@ -4,8 +4,15 @@ import math
 class Quaternion:
     """
     A simple class implementing basic quaternion arithmetic.
+
+    The operators return new quaternions, `imul()`, `iadd_scaled()` and
+    `normalize_inplace()` update the quaternion in place without
+    allocating, for use in filter loops. The components are the slots `w`,
+    `x`, `y` and `z`, a quaternion is a single heap object.
     """
 
+    __slots__ = ('w', 'x', 'y', 'z')
+
     def __init__(self, w_or_q, x=None, y=None, z=None):
         """
         Initializes a Quaternion object
@@ -15,9 +22,14 @@ class Quaternion:
         :param y: The second imaginary part if w_or_q is a scalar
         :param z: The third imaginary part if w_or_q is a scalar
         """
-        if isinstance(w_or_q, (int, float)) and isinstance(x, (int, float)) and isinstance(y, (int, float)) and isinstance(z, (int, float)):
-            q = (w_or_q, x, y, z)
-        elif isinstance(w_or_q, Quaternion):
+        # Fast path of w x y z, used by all the operators
+        if z is not None:
+            self.w = w_or_q
+            self.x = x
+            self.y = y
+            self.z = z
+            return
+        if isinstance(w_or_q, Quaternion):
             q = w_or_q.q
         else:
             if len(w_or_q) != 4:
@@ -35,7 +47,59 @@ class Quaternion:
         :rtype : Quaternion
         :return: the conjugate of the quaternion
         """
-        return Quaternion(self[0], -self[1], -self[2], -self[3])
+        return Quaternion(self.w, -self.x, -self.y, -self.z)
+
+    def imul(self, other):
+        """
+        Multiplies the quaternion in place by another quaternion (on the
+        right) or a scalar
+        :param other: a Quaternion object or a number
+        :return: self
+        """
+        if isinstance(other, Quaternion):
+            a0 = self.w
+            a1 = self.x
+            a2 = self.y
+            a3 = self.z
+            b0 = other.w
+            b1 = other.x
+            b2 = other.y
+            b3 = other.z
+            self.w = a0*b0 - a1*b1 - a2*b2 - a3*b3
+            self.x = a0*b1 + a1*b0 + a2*b3 - a3*b2
+            self.y = a0*b2 - a1*b3 + a2*b0 + a3*b1
+            self.z = a0*b3 + a1*b2 - a2*b1 + a3*b0
+        else:
+            self.w *= other
+            self.x *= other
+            self.y *= other
+            self.z *= other
+        return self
+
+    def iadd_scaled(self, other, scale):
+        """
+        Adds `other * scale` element-wise in place
+        :param other: a Quaternion object or a 4-element array
+        :param scale: a number
+        :return: self
+        """
+        self.w += other[0]*scale
+        self.x += other[1]*scale
+        self.y += other[2]*scale
+        self.z += other[3]*scale
+        return self
+
+    def normalize_inplace(self):
+        """
+        Scales the quaternion to unit length in place
+        :return: self
+        """
+        n = math.sqrt(self.w*self.w + self.x*self.x + self.y*self.y + self.z*self.z)
+        self.w /= n
+        self.x /= n
+        self.y /= n
+        self.z /= n
+        return self
 
     def to_angle_axis(self):
         """
@@ -49,9 +113,9 @@ class Quaternion:
         imaginary_factor = math.sin(rad / 2)
         if abs(imaginary_factor) < 1e-8:
             return 0, 1, 0, 0
-        x = self._q[1] / imaginary_factor
-        y = self._q[2] / imaginary_factor
-        z = self._q[3] / imaginary_factor
+        x = self.x / imaginary_factor
+        y = self.y / imaginary_factor
+        z = self.z / imaginary_factor
         return rad, x, y, z
 
     @staticmethod
@@ -88,19 +152,8 @@ class Quaternion:
         :param other: a Quaternion object or a number
         :return: a Quaternion object
         """
-        if isinstance(other, Quaternion):
-            w = self._q[0]*other._q[0] - self._q[1]*other._q[1] - \
-                self._q[2]*other._q[2] - self._q[3]*other._q[3]
-            x = self._q[0]*other._q[1] + self._q[1]*other._q[0] + \
-                self._q[2]*other._q[3] - self._q[3]*other._q[2]
-            y = self._q[0]*other._q[2] - self._q[1]*other._q[3] + \
-                self._q[2]*other._q[0] + self._q[3]*other._q[1]
-            z = self._q[0]*other._q[3] + self._q[1]*other._q[2] - \
-                self._q[2]*other._q[1] + self._q[3]*other._q[0]
-
-            return Quaternion(w, x, y, z)
-        elif isinstance(other, (int, float)):
-            return Quaternion(self[0]*other, self[1]*other, self[2]*other, self[3]*other)
+        if isinstance(other, (Quaternion, int, float)):
+            return Quaternion(self.w, self.x, self.y, self.z).imul(other)
         else:
             raise ValueError(
                 'Quaternions must be multiplied with other quaternions or a number')
@@ -119,13 +172,13 @@ class Quaternion:
                 raise TypeError(
                     "Quaternions must be added to other quaternions or a 4-element array")
 
-        return Quaternion(self[0]+other[0], self[1]+other[1], self[2]+other[2], self[3]+other[3])
+        return Quaternion(self.w, self.x, self.y, self.z).iadd_scaled(other, 1)
 
     def __radd__(self, other):
         return self + other
 
     def __neg__(self):
-        return -1*self
+        return Quaternion(-self.w, -self.x, -self.y, -self.z)
 
     def __sub__(self, other):
         """
@@ -138,7 +191,7 @@ class Quaternion:
                 raise TypeError(
                     "Quaternions must be added to other quaternions or a 4-element array")
 
-        return Quaternion(self[0]-other[0], self[1]-other[1], self[2]-other[2], self[3]-other[3])
+        return Quaternion(self.w, self.x, self.y, self.z).iadd_scaled(other, -1)
 
     def __rsub__(self, other):
         return (-self) + other
@@ -149,15 +202,27 @@ class Quaternion:
     # Implementing other interfaces to ease working with the class
 
     def _set_q(self, q):
-        self._q = q
+        self.w, self.x, self.y, self.z = q
 
     def _get_q(self):
-        return self._q
+        return self.w, self.x, self.y, self.z
 
     q = property(_get_q, _set_q)
 
     def __getitem__(self, item):
-        return self._q[item]
+        # Components by index without building a tuple
+        if item == 0:
+            return self.w
+        if item == 1:
+            return self.x
+        if item == 2:
+            return self.y
+        if item == 3:
+            return self.z
+        return self.q[item]
 
     def __iter__(self):
-        yield from self._q
+        yield self.w
+        yield self.x
+        yield self.y
+        yield self.z
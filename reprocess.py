@@ -0,0 +1,210 @@
+"""
+Host side reprocessing of downloaded sessions, binary `.bin` and text
+`.txt` ones, across a process pool.
+
+    $ python reprocess.py sessions/ --beta 0.1 > metrics.csv
+
+Sessions are handed to the workers in chunks of similar sized files, each
+worker runs the chunk through `madgwick_batch.process()` in lockstep.
+Results are cached in `--cache` keyed by the SHA-256 of the session file
+and the processing parameters, so rerunning after a calibration or
+algorithm change only processes what changed. The cached `.npz` holds the
+orientation array along with the metrics.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import os
+import sys
+
+import numpy as np
+
+import madgwick_batch
+import session_reader
+
+# Bump when the processing changes to invalidate cached results
+VERSION = 1
+
+# Sessions per work unit
+CHUNK_SIZE = 8
+
+METRICS = ('samples', 'duration', 'mean_acceleration', 'max_acceleration', 'max_rotation_rate', 'total_rotation')
+
+
+def discover(paths):
+    """
+    Finds the session files in `paths`, files are used as is and
+    directories are searched recursively.
+    :return: Sorted list of paths
+    """
+    found = []
+    for path in paths:
+        if not os.path.isdir(path):
+            found.append(path)
+            continue
+        for root, _, names in os.walk(path):
+            found.extend(os.path.join(root, name) for name in names if name.endswith(('.bin', '.txt')))
+    return sorted(found)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(digest, beta, magnetometer, text_freq):
+    params = '{} {} {} {} {}'.format(digest, VERSION, beta, magnetometer, text_freq)
+    return hashlib.sha256(params.encode()).hexdigest()
+
+
+def load(path, text_freq=20):
+    """
+    Decodes a binary or text session file.
+    :param text_freq: The sample rate of text sessions, which was not logged
+    """
+    if path.endswith('.txt'):
+        return session_reader.load_text(path, text_freq)
+    return session_reader.load(path)
+
+
+def metrics(session, orientation):
+    """
+    Derived metrics of a session and its orientation.
+    :return: dict with a value for every name in `METRICS`
+    """
+    acceleration = np.linalg.norm(session.acceleration, axis=1)
+    rotation_rate = np.linalg.norm(session.gyro, axis=1)
+    # Angles between consecutive orientations
+    dots = np.abs(np.sum(orientation[1:] * orientation[:-1], axis=1))
+    angles = 2 * np.arccos(np.clip(dots, 0, 1))
+    n = len(session)
+    return {
+        'samples': n,
+        'duration': float(session.time[-1]) if n else 0.0,
+        'mean_acceleration': float(acceleration.mean()) if n else 0.0,
+        'max_acceleration': float(acceleration.max()) if n else 0.0,
+        'max_rotation_rate': float(rotation_rate.max()) if n else 0.0,
+        'total_rotation': float(angles.sum()),
+    }
+
+
+def process_chunk(jobs, beta, magnetometer, text_freq, cache_dir):
+    """
+    Work unit of the process pool, processes and caches a chunk of
+    sessions.
+    :param jobs: List of session paths and their cache keys
+    :return: List of the path, metrics and error message of every session,
+        the metrics are None if the session could not be decoded
+    """
+    results = []
+    sessions = []
+    for path, key in jobs:
+        try:
+            sessions.append((path, key, load(path, text_freq)))
+        except (OSError, ValueError) as e:
+            results.append((path, None, str(e)))
+
+    orientations = madgwick_batch.process([session for _, _, session in sessions], beta=beta,
+                                          magnetometer=magnetometer)
+    for (path, key, session), orientation in zip(sessions, orientations):
+        values = metrics(session, orientation)
+        cache_path = os.path.join(cache_dir, key + '.npz')
+        with open(cache_path + '.tmp', 'wb') as f:
+            np.savez(f, orientation=orientation, **values)
+        os.replace(cache_path + '.tmp', cache_path)
+        results.append((path, values, None))
+    return results
+
+
+def _cached(cache_dir, key):
+    try:
+        with np.load(os.path.join(cache_dir, key + '.npz')) as data:
+            return {name: data[name].item() for name in METRICS}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def reprocess(paths, beta=0.041, magnetometer=True, text_freq=20, cache_dir='.reprocess-cache',
+              workers=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Processes every session file in `paths`, reusing cached results.
+    :param paths: Session files or directories, see `discover()`
+    :param beta: Algorithm gain beta
+    :param magnetometer: Use the 9DOF update, otherwise 6DOF
+    :param text_freq: The sample rate of text sessions
+    :param workers: Number of worker processes, the number of CPUs if None
+    :param progress: Called with the number of sessions done and the total
+        after every finished work unit
+    :return: dict of path to metrics, or to an error message string for
+        sessions that could not be decoded, in discovery order
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    files = discover(paths)
+    results = {}
+    pending = []
+    for path in files:
+        key = cache_key(file_hash(path), beta, magnetometer, text_freq)
+        values = _cached(cache_dir, key)
+        if values is None:
+            pending.append((path, key))
+        else:
+            results[path] = values
+
+    done = len(results)
+    if progress is not None:
+        progress(done, len(files))
+
+    # Similar sized sessions in a chunk keep the lockstep padding small
+    pending.sort(key=lambda job: os.path.getsize(job[0]))
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    if chunks:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(process_chunk, chunk, beta, magnetometer, text_freq, cache_dir)
+                       for chunk in chunks]
+            for future in concurrent.futures.as_completed(futures):
+                for path, values, error in future.result():
+                    results[path] = values if error is None else error
+                    done += 1
+                if progress is not None:
+                    progress(done, len(files))
+
+    return {path: results[path] for path in files}
+
+
+def _print_progress(done, total):
+    sys.stderr.write('\r{}/{} sessions'.format(done, total))
+    if done == total:
+        sys.stderr.write('\n')
+    sys.stderr.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reprocess downloaded sessions, prints metrics as CSV')
+    parser.add_argument('paths', nargs='+', help='session files or directories')
+    parser.add_argument('--beta', type=float, default=0.041, help='Madgwick gain')
+    parser.add_argument('--6dof', dest='magnetometer', action='store_false', help='ignore the magnetometer')
+    parser.add_argument('--text-freq', type=int, default=20, help='sample rate of text sessions in Hz')
+    parser.add_argument('--cache', default='.reprocess-cache', help='results cache directory')
+    parser.add_argument('-j', '--workers', type=int, help='worker processes, defaults to the CPU count')
+    parser.add_argument('--chunk', type=int, default=CHUNK_SIZE, help='sessions per work unit')
+    args = parser.parse_args(argv)
+
+    results = reprocess(args.paths, args.beta, args.magnetometer, args.text_freq, args.cache,
+                        args.workers, args.chunk, _print_progress)
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(('path',) + METRICS)
+    for path, values in results.items():
+        if isinstance(values, str):
+            sys.stderr.write('{}: {}\n'.format(path, values))
+            continue
+        writer.writerow([path] + [values[name] for name in METRICS])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Paces the capture loop to absolute deadlines so the sample rate does not
+drift with the time spent reading the sensor and writing to flash.
+"""
+
+# pylint: disable=import-error
+import uasyncio
+import utime
+# pylint: enable=import-error
+
+# Wake up from the scheduler this early and sleep the rest precisely, other
+# tasks may run a little past their sleep
+_SCHEDULER_SLACK_US = 2000
+
+
+class SampleClock:
+    """Class which waits for fixed rate deadlines using `utime.ticks_us()`."""
+    def __init__(self, freq):
+        """
+        :param freq: The sample rate in Hz
+        """
+        self.period_us = 1000000 // freq
+        self.missed = 0
+        self._deadline = utime.ticks_us()
+        self._last = self._deadline
+
+    def wait(self):
+        """
+        Sleeps until the next deadline. Deadlines which have already passed
+        by a full period are skipped and counted in `missed`.
+        :return: Microseconds since the previous call returned
+        """
+        period = self.period_us
+        deadline = utime.ticks_add(self._deadline, period)
+        late = utime.ticks_diff(utime.ticks_us(), deadline)
+        if late < 0:
+            utime.sleep_us(-late)
+        elif late >= period:
+            skipped = late // period
+            self.missed += skipped
+            deadline = utime.ticks_add(deadline, skipped * period)
+        self._deadline = deadline
+
+        now = utime.ticks_us()
+        elapsed = utime.ticks_diff(now, self._last)
+        self._last = now
+        return elapsed
+
+    async def wait_async(self):
+        """
+        Like `wait()`, but sleeps in the uasyncio scheduler so other tasks
+        run until shortly before the deadline.
+        :return: Microseconds since the previous call returned
+        """
+        deadline = utime.ticks_add(self._deadline, self.period_us)
+        early = utime.ticks_diff(deadline, utime.ticks_us()) - _SCHEDULER_SLACK_US
+        if early > 0:
+            await uasyncio.sleep_ms(early // 1000)
+        return self.wait()
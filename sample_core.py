@@ -0,0 +1,135 @@
+"""
+Acquisition on the second RP2040 core into a double buffer of raw session
+records, so flash writes, the button, LEDs and serial commands on core 0
+never delay sampling.
+
+Core 1 fills one half while core 0 writes the other to flash. A half is
+handed over by publishing its record count, core 0 sets it back to 0 once
+the half is written. Each count has a single writer at a time, so no lock
+is needed.
+"""
+
+# pylint: disable=import-error
+import _thread
+import uasyncio
+import ustruct
+import utime
+# pylint: enable=import-error
+
+from sample_clock import SampleClock
+from session_format import RECORD_RAW, FLAG_TIMESTAMPS, TIMESTAMP_FMT, record_size
+
+# Records use the RECORD_RAW layout with FLAG_TIMESTAMPS
+RECORD_FORMAT = RECORD_RAW
+FLAGS = FLAG_TIMESTAMPS
+_RECORD_SIZE = record_size(RECORD_FORMAT, FLAGS)
+
+
+class SampleCore:
+    """
+    Class which samples an MPU9250 at a fixed rate on core 1 into two halves
+    of `slots` records. The capture loop drains it into a `SessionWriter`
+    created with `RECORD_FORMAT` and `FLAGS`.
+    """
+    def __init__(self, sensor, freq, slots=128):
+        self._sensor = sensor
+        self._freq = freq
+        self._half = slots // 2
+        self._bufs = (bytearray(self._half * _RECORD_SIZE), bytearray(self._half * _RECORD_SIZE))
+
+        # Register views of every slot are sliced once up front, the
+        # sampling loop only indexes them.
+        self._motion = ([], [])
+        self._mag = ([], [])
+        for half, buf in enumerate(self._bufs):
+            view = memoryview(buf)
+            for i in range(self._half):
+                offset = i * _RECORD_SIZE + 4
+                self._motion[half].append(view[offset:offset + 14])
+                self._mag[half].append(view[offset + 14:offset + 20])
+
+        # Records of a half published to core 0, 0 while core 1 owns it
+        self._counts = [0, 0]
+        # Half core 0 drains next, halves are published alternately
+        self._next = 0
+
+        self._running = False
+        self._done = True
+        self._clock = None
+
+        self.overflows = 0
+        self.high_water = 0
+
+    @property
+    def missed(self):
+        """Sample deadlines core 1 could not keep."""
+        return self._clock.missed if self._clock is not None else 0
+
+    def start(self):
+        self._running = True
+        self._done = False
+        _thread.start_new_thread(self._run, ())
+
+    def stop(self):
+        """
+        Stops sampling and waits for core 1 to publish its last records.
+        """
+        self._running = False
+        while not self._done:
+            utime.sleep_ms(1)
+
+    async def stop_async(self):
+        """
+        Like `stop()`, but waits in the uasyncio scheduler so the other
+        tasks keep running.
+        """
+        self._running = False
+        while not self._done:
+            await uasyncio.sleep_ms(1)
+
+    def drain(self, writer):
+        """
+        Writes every published half to `writer`.
+        :return: The number of records written
+        """
+        written = 0
+        while True:
+            half = self._next
+            count = self._counts[half]
+            if not count:
+                return written
+            writer.write_records(memoryview(self._bufs[half])[:count * _RECORD_SIZE], count)
+            written += count
+            self._counts[half] = 0
+            self._next = half ^ 1
+
+    def _run(self):
+        clock = self._clock = SampleClock(self._freq)
+        counts = self._counts
+        half = 0
+        fill = 0
+        last = utime.ticks_us()
+        while self._running:
+            clock.wait()
+            if counts[half]:
+                # Core 0 has not written this half yet. Dropped samples show
+                # up as a longer elapsed time of the next record that fits.
+                self.overflows += 1
+                continue
+
+            now = utime.ticks_us()
+            ustruct.pack_into(TIMESTAMP_FMT, self._bufs[half], fill * _RECORD_SIZE, utime.ticks_diff(now, last))
+            last = now
+            self._sensor.read_raw_into(self._motion[half][fill], self._mag[half][fill])
+            fill += 1
+
+            pending = fill + counts[half ^ 1]
+            if pending > self.high_water:
+                self.high_water = pending
+            if fill == self._half:
+                counts[half] = fill
+                half ^= 1
+                fill = 0
+        if fill:
+            counts[half] = fill
+        self._done = True
@@ -0,0 +1,117 @@
+"""
+Acquisition from the MPU6500 hardware FIFO. Samples are clocked by the
+sensor and drained in batches, so sample spacing does not depend on the
+capture loop timing.
+
+If the capture loop falls behind the FIFO fills up, stops and may hold a
+partial sample. It is then reset and the time lost until the reset is
+added to the elapsed time of the next record, so the host time axis keeps
+the gap.
+"""
+
+# pylint: disable=import-error
+import ustruct
+import utime
+# pylint: enable=import-error
+
+from mpu6500 import FIFO_SIZE, FIFO_SAMPLE_SIZE, DLPF_CFG_41HZ
+from session_format import RECORD_RAW, FLAG_TIMESTAMPS, TIMESTAMP_FMT, record_size
+
+# Records use the RECORD_RAW layout with FLAG_TIMESTAMPS
+RECORD_FORMAT = RECORD_RAW
+FLAGS = FLAG_TIMESTAMPS
+_RECORD_SIZE = record_size(RECORD_FORMAT, FLAGS)
+
+_SAMPLES = FIFO_SIZE // FIFO_SAMPLE_SIZE
+
+
+class SampleFifo:
+    """
+    Class which drains MPU6500 FIFO batches of an MPU9250 into a
+    `SessionWriter` created with `RECORD_FORMAT` and `FLAGS`. The
+    magnetometer is read once per batch, every record of a batch gets that
+    reading.
+    """
+    def __init__(self, sensor, freq, dlpf=DLPF_CFG_41HZ):
+        """
+        :param sensor: The MPU9250 to sample
+        :param freq: The sample rate in Hz, rounded to 1 kHz / (1 + divider)
+        :param dlpf: Gyro low pass filter, one of the `DLPF_CFG_*` values
+        """
+        self._sensor = sensor
+        self._rate_div = max(0, 1000 // freq - 1)
+        self._dlpf = dlpf
+        # Hardware sample period logged as the elapsed time of each record
+        self.period_us = 1000 * (1 + self._rate_div)
+
+        self._fifo = bytearray(_SAMPLES * FIFO_SAMPLE_SIZE)
+        self._fifo_view = memoryview(self._fifo)
+        self._records = bytearray(_SAMPLES * _RECORD_SIZE)
+        self._records_view = memoryview(self._records)
+        self._mag = bytearray(6)
+
+        # The elapsed time is the same for every record
+        for i in range(_SAMPLES):
+            ustruct.pack_into(TIMESTAMP_FMT, self._records, i * _RECORD_SIZE, self.period_us)
+
+        # Time the FIFO was last cleared and the samples read since, the
+        # time lost to an overflow is logged with the next record
+        self._started = 0
+        self._samples = 0
+        self._gap_us = 0
+
+        self.overflows = 0
+        self.high_water = 0
+
+    def start(self):
+        mpu6500 = self._sensor.mpu6500
+        mpu6500.set_sample_rate(self._rate_div, self._dlpf)
+        mpu6500.fifo_enable()
+        self._started = utime.ticks_us()
+        self._samples = 0
+
+    def stop(self):
+        self._sensor.mpu6500.fifo_enable(False)
+
+    def drain(self, writer):
+        """
+        Reads all samples in the FIFO with one burst and writes them to
+        `writer` as one block.
+        :return: The number of records written
+        """
+        mpu6500 = self._sensor.mpu6500
+        count = mpu6500.read_fifo_into(self._fifo)
+        # These samples follow the last reset, the pending gap goes before them
+        gap_us = 0
+        if count:
+            gap_us = self._gap_us
+            self._gap_us = 0
+        self._samples += count
+        if mpu6500.fifo_overflow:
+            # Samples since the FIFO stopped are lost, a partial one may be
+            # left at its head
+            self.overflows += 1
+            mpu6500.fifo_enable()
+            now = utime.ticks_us()
+            self._gap_us += max(0, utime.ticks_diff(now, self._started) - self._samples * self.period_us)
+            self._started = now
+            self._samples = 0
+        if not count:
+            return 0
+        self.high_water = max(self.high_water, count)
+
+        self._sensor.ak8963.read_raw_into(self._mag)
+        records = self._records_view
+        fifo = self._fifo_view
+        mag = self._mag
+        for i in range(count):
+            offset = i * _RECORD_SIZE + 4
+            records[offset:offset + 14] = fifo[i * FIFO_SAMPLE_SIZE:(i + 1) * FIFO_SAMPLE_SIZE]
+            records[offset + 14:offset + 20] = mag
+
+        if gap_us:
+            ustruct.pack_into(TIMESTAMP_FMT, self._records, 0, self.period_us + gap_us)
+        writer.write_records(records[:count * _RECORD_SIZE], count)
+        if gap_us:
+            ustruct.pack_into(TIMESTAMP_FMT, self._records, 0, self.period_us)
+        return count
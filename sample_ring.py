@@ -0,0 +1,118 @@
+"""
+Interrupt driven acquisition into a preallocated ring of raw session
+records, so slow flash writes in the capture loop do not delay sampling.
+"""
+
+# pylint: disable=import-error
+import ustruct
+import utime
+from machine import Pin, Timer
+# pylint: enable=import-error
+
+from session_format import RECORD_RAW, FLAG_TIMESTAMPS, TIMESTAMP_FMT, record_size
+
+# Records use the RECORD_RAW layout with FLAG_TIMESTAMPS
+RECORD_FORMAT = RECORD_RAW
+FLAGS = FLAG_TIMESTAMPS
+_RECORD_SIZE = record_size(RECORD_FORMAT, FLAGS)
+
+
+class SampleRing:
+    """
+    Class which samples an MPU9250 from a `machine.Timer` or the MPU6500
+    data ready interrupt into a ring of `slots` records. The capture loop
+    drains it into a `SessionWriter` created with `RECORD_FORMAT` and
+    `FLAGS`.
+    """
+    def __init__(self, sensor, slots=64):
+        self._sensor = sensor
+        self._slots = slots
+        self._buf = bytearray(slots * _RECORD_SIZE)
+        self._view = memoryview(self._buf)
+
+        # Register views of every slot are sliced once up front, the
+        # interrupt handler only indexes them.
+        self._motion = []
+        self._mag = []
+        for i in range(slots):
+            offset = i * _RECORD_SIZE + 4
+            self._motion.append(self._view[offset:offset + 14])
+            self._mag.append(self._view[offset + 14:offset + 20])
+
+        # Monotonic record counters, written only by the interrupt handler
+        # and the capture loop respectively
+        self._head = 0
+        self._tail = 0
+
+        self._timer = None
+        self._pin = None
+        self._last = utime.ticks_us()
+
+        self.overflows = 0
+        self.high_water = 0
+
+    def start_timer(self, freq):
+        """
+        Samples at `freq` Hz from a periodic `machine.Timer`.
+        """
+        self._last = utime.ticks_us()
+        self._timer = Timer(mode=Timer.PERIODIC, freq=freq, callback=self._sample)
+
+    def start_data_ready(self, pin):
+        """
+        Samples on every rising edge of the MPU6500 INT pin. The sensor must
+        have its sample rate set and the data ready interrupt enabled, see
+        `MPU6500.set_sample_rate()` and `MPU6500.data_ready_interrupt()`.
+        """
+        self._last = utime.ticks_us()
+        self._pin = pin
+        pin.irq(trigger=Pin.IRQ_RISING, handler=self._sample)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+        if self._pin is not None:
+            self._pin.irq(handler=None)
+            self._pin = None
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def drain(self, writer):
+        """
+        Writes all buffered records to `writer` in at most two contiguous
+        blocks.
+        :return: The number of records written
+        """
+        head = self._head
+        count = head - self._tail
+        if not count:
+            return 0
+
+        start = self._tail % self._slots
+        first = min(count, self._slots - start)
+        writer.write_records(self._view[start * _RECORD_SIZE:(start + first) * _RECORD_SIZE], first)
+        if count > first:
+            writer.write_records(self._view[0:(count - first) * _RECORD_SIZE], count - first)
+
+        self._tail = head
+        return count
+
+    def _sample(self, _):
+        head = self._head
+        used = head - self._tail
+        if used >= self._slots:
+            # Dropped samples show up as a longer elapsed time of the next
+            # record that fits.
+            self.overflows += 1
+            return
+        if used >= self.high_water:
+            self.high_water = used + 1
+
+        i = head % self._slots
+        now = utime.ticks_us()
+        ustruct.pack_into(TIMESTAMP_FMT, self._buf, i * _RECORD_SIZE, utime.ticks_diff(now, self._last))
+        self._last = now
+        self._sensor.read_raw_into(self._motion[i], self._mag[i])
+        self._head = head + 1
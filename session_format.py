@@ -0,0 +1,140 @@
+"""
+Binary session log format shared by the tracker and the host side tools.
+
+A session file is a fixed size header followed by fixed size records. All
+values are little-endian.
+
+Header (`HEADER_FMT`):
+
+    magic           4s  `MAGIC`
+    version         B   `FORMAT_VERSION`
+    record_format   B   one of the `RECORD_*` values
+    flags           H   `FLAG_*` bits
+    sample_freq     H   configured sample rate in Hz
+    accel_so        f   accelerometer LSB per g
+    accel_sf        f   accelerometer scale factor, ie. m/s^2 per g
+    gyro_so         f   gyro LSB per deg/s
+    gyro_sf         f   gyro scale factor, ie. rad/s per deg/s
+    accel_offset    3f  accelerometer calibration offset
+    gyro_offset     3f  gyro calibration offset
+    mag_so          f   magnetometer uT per LSB
+    mag_adjustment  3f  AK8963 factory sensitivity adjustment
+    mag_offset      3f  magnetometer hard iron offset
+    mag_scale       3f  magnetometer soft iron scale
+    mag_axis_map    3B  magnetometer axis remap, see `MPU9250`
+    mag_axis_sign   3b  magnetometer axis signs, see `MPU9250`
+
+Records:
+
+    RECORD_FLOAT32  9f  gyro X, Y, Z in rad/s, acceleration X, Y, Z in
+                        m/s^2 and magnetic X, Y, Z in uT as logged by the
+                        tracker
+    RECORD_RAW      >7h MPU6500 registers ACCEL_XOUT_H to GYRO_ZOUT_L as
+                        read, ie. big-endian accel X, Y, Z, temperature
+                        and gyro X, Y, Z counts
+                    <3h AK8963 registers HXL to HZH as read, ie.
+                        little-endian magnetic X, Y, Z counts in the
+                        AK8963 frame
+
+Raw records are converted on the host using the header, no calibration or
+axis remapping is applied on the tracker.
+
+With `FLAG_TIMESTAMPS` set every record is prefixed by a `<I` count of
+microseconds since the previous sample, so the host can recover the true
+sample spacing including missed deadlines.
+
+With `FLAG_FOOTER` set the records are followed by a footer of capture
+loop statistics (`FOOTER_FMT`), see `loop_stats.py`:
+
+    read            4I  count, min, max and p99 microseconds of sensor reads
+    encode          4I  the same of packing the record
+    write           4I  the same of appending it to the block buffer,
+                        including flash writes
+    iteration       4I  the same of whole loop iterations
+    overruns        I   iterations longer than the sample period
+    gc_collections  I   garbage collections during the capture
+    missed          I   sample deadlines skipped
+    magic           4s  `FOOTER_MAGIC`
+    size            I   `FOOTER_SIZE`
+
+A session cut short by a power loss has no footer, readers check for the
+trailing magic and size.
+
+With `FLAG_DELTA` set, only valid for `RECORD_RAW`, the records are
+compressed into frames of up to `KEYFRAME_INTERVAL` records (`FRAME_FMT`):
+
+    size            H   bytes of the frame including this header
+    count           H   records in the frame
+    keyframe            the first record in full, as above
+    deltas              the other `count - 1` records as varints
+
+Every delta record holds the difference of each value from the previous
+record, the timestamp first if logged and then the accel X, Y, Z,
+temperature, gyro X, Y, Z and magnetic X, Y, Z counts. Count differences
+wrap around to 16 bit. Each difference is zigzag encoded, ie. 0, -1, 1,
+-2, ... become 0, 1, 2, 3, ..., and written as a varint of 7 bits per
+byte, low bits first, with the top bit set on all but the last byte.
+Frames start at known values, so a reader can skip from frame to frame
+by their sizes. A session cut short by a power loss loses the last frame.
+"""
+
+MAGIC = b'CACS'
+FORMAT_VERSION = 1
+
+RECORD_FLOAT32 = 0
+RECORD_RAW = 1
+
+FLAG_TIMESTAMPS = 0x0001
+FLAG_FOOTER = 0x0002
+FLAG_DELTA = 0x0004
+
+HEADER_FMT = '<4sBBHH4f3f3ff3f3f3f3B3b'
+HEADER_SIZE = 96
+
+FOOTER_MAGIC = b'CACF'
+FOOTER_FMT = '<19I4sI'
+FOOTER_SIZE = 84
+
+FRAME_FMT = '<HH'
+FRAME_HEADER_SIZE = 4
+KEYFRAME_INTERVAL = 64
+
+TIMESTAMP_FMT = '<I'
+FLOAT32_FMT = '<9f'
+RAW_MOTION_FMT = '>7h'
+RAW_MAG_FMT = '<3h'
+
+_RECORD_SIZE = {
+    RECORD_FLOAT32: 36,
+    RECORD_RAW: 20,
+}
+
+
+def record_size(record_format, flags=0):
+    """
+    Returns the size of a single record in bytes.
+    :param record_format: One of the `RECORD_*` values
+    :param flags: `FLAG_*` bits of the session
+    :return: int
+    """
+    try:
+        size = _RECORD_SIZE[record_format]
+    except KeyError:
+        raise ValueError('Unknown record format {}'.format(record_format))
+    if flags & FLAG_TIMESTAMPS:
+        size += 4
+    return size
+
+
+def delta_size(flags=0):
+    """
+    Returns the largest size of a raw record in a `FLAG_DELTA` frame, apart
+    from the keyframe, in bytes. The 10 counts take 3 varint bytes at most
+    and the timestamp 5.
+    :param flags: `FLAG_*` bits of the session
+    :return: int
+    """
+    size = 30
+    if flags & FLAG_TIMESTAMPS:
+        size += 5
+    return size
@@ -0,0 +1,135 @@
+"""
+On-device index of the recorded sessions, kept in a small JSON manifest so
+the host can sync incrementally with the `ls`, `get` and `done` commands.
+
+Every session file has an entry of its size in bytes, number of samples,
+CRC32 and whether the host has marked it as downloaded. The manifest is
+written to a temporary file and renamed over the old one, so a power loss
+never leaves a half written index.
+"""
+
+# pylint: disable=import-error
+import os
+import ubinascii
+import ujson
+import ustruct
+# pylint: enable=import-error
+
+from session_format import MAGIC, FLAG_FOOTER, FLAG_DELTA, HEADER_SIZE, FOOTER_MAGIC, FOOTER_SIZE, record_size
+
+SIZE = 0
+SAMPLES = 1
+CRC = 2
+TRANSFERRED = 3
+
+
+class SessionIndex:
+    """Class which keeps the session manifest in sync with the session directory."""
+    def __init__(self, directory='./sessions', path='./sessions.json'):
+        self.directory = directory
+        self.path = path
+        try:
+            with open(path, 'r') as f:
+                manifest = ujson.load(f)
+            self.last = manifest['last']
+            self.sessions = manifest['sessions']
+        except (OSError, ValueError, KeyError):
+            self.last = 0
+            self.sessions = {}
+
+    def next_name(self):
+        """
+        Reserves the file name of the next session. Numbers are never reused,
+        even after old sessions were pruned.
+        """
+        for name in os.listdir(self.directory):
+            if name.endswith('.txt') or name.endswith('.bin'):
+                self.last = max(self.last, int(name[:-4]))
+        self.last += 1
+        self.save()
+        return '{}.bin'.format(self.last)
+
+    def add(self, name, size, samples, crc):
+        self.sessions[name] = [size, samples, crc, False]
+        self.save()
+
+    def mark_transferred(self, name):
+        """
+        :return: False if there is no session `name`
+        """
+        if name not in self.sessions:
+            return False
+        self.sessions[name][TRANSFERRED] = True
+        self.save()
+        return True
+
+    def refresh(self):
+        """
+        Adds sessions missing from the index, eg. recorded before it
+        existed or cut short by a power loss, and drops deleted ones.
+        """
+        names = [name for name in os.listdir(self.directory) if os.stat(self._path(name))[6]]
+        for name in list(self.sessions):
+            if name not in names:
+                del self.sessions[name]
+        for name in names:
+            if name not in self.sessions:
+                self.sessions[name] = self._scan(name) + [False]
+        self.save()
+
+    def prune(self):
+        """
+        Deletes sessions which the host has downloaded to free flash.
+        """
+        for name in list(self.sessions):
+            if self.sessions[name][TRANSFERRED]:
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+                del self.sessions[name]
+        self.save()
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            ujson.dump({'last': self.last, 'sessions': self.sessions}, f)
+        os.rename(tmp, self.path)
+
+    def _path(self, name):
+        return '{}/{}'.format(self.directory, name)
+
+    def _scan(self, name, buf=bytearray(512)):
+        size = 0
+        crc = 0
+        record = 0
+        footer = False
+        view = memoryview(buf)
+        with open(self._path(name), 'rb') as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                if not size and n >= HEADER_SIZE and buf[0:4] == MAGIC:
+                    # record_format and flags from the session header,
+                    # delta compressed records vary in size
+                    flags = buf[6] | buf[7] << 8
+                    footer = bool(flags & FLAG_FOOTER)
+                    try:
+                        if not flags & FLAG_DELTA:
+                            record = record_size(buf[5], flags)
+                    except ValueError:
+                        pass
+                crc = ubinascii.crc32(view[:n], crc)
+                size += n
+            # The footer magic and size end the file, a session cut short
+            # by a power loss has no footer
+            end = size
+            if footer and size >= HEADER_SIZE + FOOTER_SIZE:
+                f.seek(size - 8)
+                f.readinto(view[:8])
+                if buf[0:4] == FOOTER_MAGIC and ustruct.unpack_from('<I', buf, 4)[0] == FOOTER_SIZE:
+                    end -= FOOTER_SIZE
+        # Sample count is unknown for text and delta compressed sessions
+        samples = (end - HEADER_SIZE) // record if record else 0
+        return [size, samples, crc]
@@ -0,0 +1,285 @@
+"""
+Host side reader for binary session logs, see `session_format` for the
+layout.
+
+    >>> session = session_reader.load('sessions/1.bin')
+    >>> session.sample_freq, session.gyro.shape
+    (20, (1200, 3))
+
+Text sessions logged before the binary format are read with `load_text()`.
+"""
+
+import base64
+import struct
+
+import numpy as np
+
+from session_format import (
+    MAGIC, RECORD_FLOAT32, RECORD_RAW, FLAG_TIMESTAMPS, FLAG_FOOTER, FLAG_DELTA, HEADER_FMT, HEADER_SIZE,
+    FOOTER_MAGIC, FOOTER_FMT, FOOTER_SIZE, FRAME_FMT, FRAME_HEADER_SIZE, TIMESTAMP_FMT, FLOAT32_FMT, record_size
+)
+
+_PHASES = ('read', 'encode', 'write', 'iteration')
+
+# Die temperature conversion, see mpu6500.py
+_TEMP_SO = 333.87
+_TEMP_OFFSET = 21
+
+_RECORD_FIELDS = {
+    RECORD_FLOAT32: [('values', '<f4', (9,))],
+    RECORD_RAW: [('motion', '>i2', (7,)), ('mag', '<i2', (3,))],
+}
+
+
+class Session:
+    """
+    A decoded session. `gyro`, `acceleration` and `magnetic` are `n x 3`
+    float arrays in rad/s, m/s^2 and uT, `temperature` is an array of die
+    temperatures in celcius for raw sessions and None otherwise. `time` is
+    the time of each sample in seconds since the first one, measured on the
+    tracker for sessions with timestamps and derived from `sample_freq`
+    otherwise. `stats` are the capture loop statistics of the footer, a dict
+    of the count, min, max and p99 microseconds of every phase and the
+    overruns, gc_collections and missed counts, or None without a footer.
+    The remaining attributes are the header fields.
+    """
+
+    def __init__(self, header, gyro=None, acceleration=None, magnetic=None, temperature=None, time=None):
+        (magic, self.version, self.record_format, self.flags, self.sample_freq,
+         self.accel_so, self.accel_sf, self.gyro_so, self.gyro_sf) = header[:9]
+        if magic != MAGIC:
+            raise ValueError('Not a session log')
+        self.accel_offset = header[9:12]
+        self.gyro_offset = header[12:15]
+        self.mag_so = header[15]
+        self.mag_adjustment = header[16:19]
+        self.mag_offset = header[19:22]
+        self.mag_scale = header[22:25]
+        self.mag_axis_map = header[25:28]
+        self.mag_axis_sign = header[28:31]
+
+        self.gyro = gyro
+        self.acceleration = acceleration
+        self.magnetic = magnetic
+        self.temperature = temperature
+        self.time = time
+        self.stats = None
+
+    def convert_raw(self, motion, mag):
+        """
+        Applies the header calibration to raw register counts, the same
+        conversions `MPU6500.read_all()`, `AK8963.magnetic` and
+        `MPU9250.magnetic` do on the tracker.
+        :param motion: `n x 7` array of accel X, Y, Z, temperature and gyro
+            X, Y, Z counts
+        :param mag: `n x 3` array of AK8963 X, Y, Z counts
+        """
+        motion = motion.astype(np.float64)
+        mag = mag.astype(np.float64)
+
+        self.acceleration = motion[:, 0:3] / self.accel_so * self.accel_sf - np.array(self.accel_offset)
+        self.gyro = motion[:, 4:7] / self.gyro_so * self.gyro_sf - np.array(self.gyro_offset)
+        self.temperature = (motion[:, 3] - _TEMP_OFFSET) / _TEMP_SO + _TEMP_OFFSET
+
+        mag *= np.array(self.mag_adjustment) * self.mag_so
+        mag -= np.array(self.mag_offset)
+        mag *= np.array(self.mag_scale)
+        self.magnetic = mag[:, list(self.mag_axis_map)] * np.array(self.mag_axis_sign)
+
+    def __len__(self):
+        return len(self.gyro)
+
+    @property
+    def sample_period(self):
+        return 1 / self.sample_freq
+
+
+def decode(data):
+    """
+    Decodes a session log.
+    :param data: The whole session file as bytes
+    :return: Session
+    """
+    if len(data) < HEADER_SIZE:
+        raise ValueError('Session log is shorter than its header')
+    header = struct.unpack_from(HEADER_FMT, data)
+    session = Session(header)
+
+    if session.record_format not in _RECORD_FIELDS:
+        raise ValueError('Unsupported record format {}'.format(session.record_format))
+    fields = _RECORD_FIELDS[session.record_format]
+    if session.flags & FLAG_TIMESTAMPS:
+        fields = [('elapsed_us', '<u4')] + fields
+    dtype = np.dtype(fields)
+
+    end = len(data)
+    if session.flags & FLAG_FOOTER:
+        session.stats = _footer(data)
+        if session.stats is not None:
+            end -= FOOTER_SIZE
+
+    if session.flags & FLAG_DELTA:
+        records = _undelta(data, end, dtype)
+    else:
+        # A session cut short by a power loss can end with a partial record
+        n = (end - HEADER_SIZE) // record_size(session.record_format, session.flags)
+        records = np.frombuffer(data, dtype=dtype, count=n, offset=HEADER_SIZE)
+    n = len(records)
+
+    if session.record_format == RECORD_FLOAT32:
+        samples = records['values'].astype(np.float64)
+        session.gyro = samples[:, 0:3]
+        session.acceleration = samples[:, 3:6]
+        session.magnetic = samples[:, 6:9]
+    else:
+        session.convert_raw(records['motion'], records['mag'])
+
+    if session.flags & FLAG_TIMESTAMPS:
+        elapsed = records['elapsed_us'].astype(np.float64)
+        if n:
+            elapsed[0] = 0
+        session.time = np.cumsum(elapsed) / 1e6
+    else:
+        session.time = np.arange(n) / session.sample_freq
+
+    return session
+
+
+def _undelta(data, end, dtype):
+    # Raw records of the FLAG_DELTA frames between the header and `end`
+    if 'motion' not in dtype.names:
+        raise ValueError('Only raw sessions are delta compressed')
+    timestamps = 'elapsed_us' in dtype.names
+    columns = 10 + timestamps
+
+    # Frames are walked by their sizes, everything else is vectorized. A
+    # session cut short by a power loss can end with a partial frame.
+    keyframes = []
+    deltas = []
+    counts = []
+    pos = HEADER_SIZE
+    while pos + FRAME_HEADER_SIZE + dtype.itemsize <= end:
+        size, count = struct.unpack_from(FRAME_FMT, data, pos)
+        if size < FRAME_HEADER_SIZE + dtype.itemsize or not count or pos + size > end:
+            break
+        keyframes.append(data[pos + FRAME_HEADER_SIZE:pos + FRAME_HEADER_SIZE + dtype.itemsize])
+        deltas.append(data[pos + FRAME_HEADER_SIZE + dtype.itemsize:pos + size])
+        counts.append(count)
+        pos += size
+    if not counts:
+        return np.zeros(0, dtype=dtype)
+
+    keyframes = np.frombuffer(b''.join(keyframes), dtype=dtype)
+    counts = np.array(counts)
+    values = _varints(b''.join(deltas))
+    if len(values) != (counts.sum() - len(counts)) * columns:
+        raise ValueError('Corrupt delta frame')
+
+    # Keyframe values followed by the differences of every frame, a cumsum
+    # restarted at every keyframe reconstructs the values
+    n = counts.sum()
+    starts = np.cumsum(counts) - counts
+    is_delta = np.ones(n, dtype=bool)
+    is_delta[starts] = False
+    rows = np.empty((n, columns), dtype=np.int64)
+    rows[is_delta] = ((values >> 1) ^ -(values & 1)).reshape(-1, columns)
+    first = 0
+    if timestamps:
+        rows[starts, 0] = keyframes['elapsed_us']
+        first = 1
+    rows[starts, first:first + 7] = keyframes['motion']
+    rows[starts, first + 7:] = keyframes['mag']
+    rows = np.cumsum(rows, axis=0)
+    before = np.zeros((len(counts), columns), dtype=np.int64)
+    before[1:] = rows[starts[1:] - 1]
+    rows -= np.repeat(before, counts, axis=0)
+
+    records = np.empty(n, dtype=dtype)
+    if timestamps:
+        records['elapsed_us'] = rows[:, 0] & 0xffffffff
+    # Counts wrap around to 16 bit
+    counts16 = ((rows[:, first:] + 0x8000) & 0xffff) - 0x8000
+    records['motion'] = counts16[:, 0:7]
+    records['mag'] = counts16[:, 7:]
+    return records
+
+
+def _varints(data):
+    # Unsigned values of the varints in `data`, see session_format
+    data = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    if not len(ends):
+        return np.zeros(0, dtype=np.int64)
+    data = data[:ends[-1] + 1]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shifts = 7 * (np.arange(len(data)) - np.repeat(starts, ends - starts + 1))
+    return np.add.reduceat((data & 0x7f).astype(np.int64) << shifts, starts)
+
+
+def _footer(data):
+    # None if the session was cut short before its footer was written
+    if len(data) < HEADER_SIZE + FOOTER_SIZE:
+        return None
+    values = struct.unpack_from(FOOTER_FMT, data, len(data) - FOOTER_SIZE)
+    if values[-2] != FOOTER_MAGIC or values[-1] != FOOTER_SIZE:
+        return None
+    stats = {}
+    for i, name in enumerate(_PHASES):
+        stats[name] = dict(zip(('count', 'min', 'max', 'p99'), values[i * 4:i * 4 + 4]))
+    stats['overruns'], stats['gc_collections'], stats['missed'] = values[16:19]
+    return stats
+
+
+def load(path):
+    """
+    Reads and decodes a session log file.
+    :param path: Path of the session file
+    :return: Session
+    """
+    with open(path, 'rb') as f:
+        return decode(f.read())
+
+
+def decode_text(text, sample_freq=20):
+    """
+    Decodes a text session, the space separated gyro, acceleration and
+    magnetic X, Y, Z values of every sample. Text sessions have no header,
+    the returned session has version 0, no calibration and the given sample
+    rate, which was not logged.
+    :param text: The whole session file as a string
+    :param sample_freq: The sample rate the session was recorded at in Hz
+    :return: Session
+    """
+    values = np.array(text.split(), dtype=np.float64)
+    # A session cut short by a power loss can end with a partial sample
+    n = len(values) // 9
+    samples = values[:n * 9].reshape(n, 9)
+    header = (MAGIC, 0, RECORD_FLOAT32, 0, sample_freq) + (0.0,) * 20 + (0, 1, 2) + (1, 1, 1)
+    return Session(header, gyro=samples[:, 0:3], acceleration=samples[:, 3:6], magnetic=samples[:, 6:9],
+                   time=np.arange(n) / sample_freq)
+
+
+def load_text(path, sample_freq=20):
+    """
+    Reads and decodes a text session file.
+    :param path: Path of the session file
+    :param sample_freq: The sample rate the session was recorded at in Hz
+    :return: Session
+    """
+    with open(path, 'r') as f:
+        return decode_text(f.read(), sample_freq)
+
+
+def from_base64(text, flags=FLAG_TIMESTAMPS):
+    """
+    Decodes one float record encoded by `session_writer.to_base64()`, as
+    logged at the end of every FILE_DEBUGGING test session line.
+    :param text: The base64 text
+    :param flags: `FLAG_*` bits of the session the record belongs to
+    :return: Tuple of the elapsed microseconds, if logged, followed by the
+        gyro, acceleration and magnetic X, Y, Z values
+    """
+    data = base64.b64decode(text)
+    if flags & FLAG_TIMESTAMPS:
+        return struct.unpack_from(TIMESTAMP_FMT, data) + struct.unpack_from(FLOAT32_FMT, data, 4)
+    return struct.unpack(FLOAT32_FMT, data)
@@ -0,0 +1,278 @@
+"""
+Host side receiver for the `sendfiles` transfer, see `transfer.py` for the
+protocol.
+
+    $ python session_sync.py /dev/ttyACM0 sessions/
+
+Uses the binary transfer mode unless `--text` is passed. With `--sync` it
+uses the session index instead: only sessions not yet downloaded are
+fetched, in byte ranges appended to a `.part` file, so an interrupted
+download resumes where it stopped on the next run. Needs pyserial to
+talk to the tracker, `receive_sessions()` itself works on any binary
+stream with `readline()`, `readinto()` and `write()`.
+"""
+
+import argparse
+import base64
+import binascii
+import os
+import struct
+import sys
+
+import numpy as np
+
+# Binary mode frame header, see transfer.py
+FRAME_FMT = '<HI'
+FRAME_SIZE = struct.calcsize(FRAME_FMT)
+
+# Bytes requested per `get` command when syncing
+RANGE_SIZE = 64 * 1024
+
+
+class TransferError(Exception):
+    pass
+
+
+class ChecksumError(TransferError):
+    """A file was received in full but failed verification."""
+    def __init__(self, name, message):
+        super().__init__(message)
+        self.name = name
+
+
+def _readline(stream):
+    line = stream.readline()
+    if not line:
+        raise TransferError('Tracker stopped sending')
+    return line.decode().rstrip('\r\n')
+
+
+def _read_exact(stream, view):
+    pos = 0
+    while pos < len(view):
+        n = stream.readinto(view[pos:])
+        if not n:
+            raise TransferError('Tracker stopped sending')
+        pos += n
+
+
+def _read_file_header(stream):
+    header = _readline(stream).split()
+    if len(header) != 3 or header[0] != 'FILE':
+        raise TransferError('Expected FILE, got {!r}'.format(' '.join(header)))
+    return os.path.basename(header[1]), int(header[2])
+
+
+def receive_file_binary(stream, out_dir):
+    """
+    Receives one file sent in binary mode straight into a NumPy buffer and
+    writes it to `out_dir` once the checksums match.
+    :return: Tuple of the path of the received file and the buffer
+    """
+    name, size = _read_file_header(stream)
+    data = np.empty(size, dtype=np.uint8)
+    _receive_frames(stream, memoryview(data), name)
+    path = os.path.join(out_dir, name)
+    data.tofile(path)
+    return path, data
+
+
+def _receive_frames(stream, view, name):
+    frame = bytearray(FRAME_SIZE)
+    crc = 0
+    received = 0
+    corrupted = False
+
+    # Always read up to the end frame so the stream stays in sync
+    while True:
+        _read_exact(stream, memoryview(frame))
+        length, chunk_crc = struct.unpack(FRAME_FMT, frame)
+        if not length:
+            break
+        if received + length > len(view):
+            # Lost sync, nothing after this can be trusted
+            raise TransferError('Frame overruns {}'.format(name))
+        chunk = view[received:received + length]
+        _read_exact(stream, chunk)
+        corrupted |= binascii.crc32(chunk) != chunk_crc
+        crc = binascii.crc32(chunk, crc)
+        received += length
+
+    if corrupted or received != len(view) or crc != chunk_crc:
+        raise ChecksumError(name, 'Corrupted transfer of {}'.format(name))
+
+
+def receive_file(stream, out_dir):
+    """
+    Receives one file, chunk by chunk, into `out_dir`. The file is written
+    to a temporary name and only renamed once the whole file checksum
+    matches.
+    :return: The path of the received file
+    """
+    name, size = _read_file_header(stream)
+
+    path = os.path.join(out_dir, name)
+    partial = path + '.part'
+    crc = 0
+    received = 0
+    corrupted = False
+    try:
+        with open(partial, 'wb') as f:
+            # Always read up to END so the stream stays in sync
+            while True:
+                line = _readline(stream)
+                if line.startswith('END '):
+                    break
+                if corrupted:
+                    continue
+                try:
+                    length, chunk_crc, data = line.split(' ', 2)
+                    chunk = base64.b64decode(data)
+                    corrupted = len(chunk) != int(length) or binascii.crc32(chunk) != int(chunk_crc, 16)
+                except (ValueError, binascii.Error):
+                    corrupted = True
+                if corrupted:
+                    continue
+                crc = binascii.crc32(chunk, crc)
+                received += len(chunk)
+                f.write(chunk)
+    except TransferError:
+        os.remove(partial)
+        raise
+
+    if corrupted or received != size or line[4:] != '{:08x}'.format(crc):
+        os.remove(partial)
+        raise ChecksumError(name, 'Corrupted transfer of {} at byte {}'.format(name, received))
+    os.replace(partial, path)
+    return path
+
+
+def receive_sessions(stream, out_dir, binary=False):
+    """
+    Receives all files of a `sendfiles` transfer, answering `ack <name>` for
+    every verified file so the tracker deletes it and `nak <name>`
+    otherwise. Must be called right after sending the `sendfiles` command,
+    or `sendfiles bin` with `binary`.
+    :return: List of received paths
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    count = int(_readline(stream))
+    paths = []
+    for _ in range(count):
+        try:
+            if binary:
+                paths.append(receive_file_binary(stream, out_dir)[0])
+            else:
+                paths.append(receive_file(stream, out_dir))
+        except ChecksumError as err:
+            print(err, file=sys.stderr)
+            stream.write('nak {}\n'.format(err.name).encode())
+            continue
+        stream.write('ack {}\n'.format(os.path.basename(paths[-1])).encode())
+    return paths
+
+
+def list_sessions(stream):
+    """
+    Reads the tracker's session index.
+    :return: Dict of session name to (size, samples, crc32, transferred)
+    """
+    stream.write(b'ls\n')
+    sessions = {}
+    for _ in range(int(_readline(stream))):
+        name, size, samples, crc, transferred = _readline(stream).split()
+        sessions[name] = (int(size), int(samples), int(crc, 16), transferred == '1')
+    return sessions
+
+
+def fetch_range(stream, name, offset, length):
+    """
+    Fetches part of a session into a NumPy buffer.
+    :return: uint8 array, shorter than `length` at the end of the file
+    """
+    stream.write('get {} {} {}\n'.format(name, offset, length).encode())
+    line = _readline(stream)
+    if not line.startswith('RANGE '):
+        raise TransferError('Cannot fetch {}: {}'.format(name, line))
+    data = np.empty(int(line.split()[3]), dtype=np.uint8)
+    _receive_frames(stream, memoryview(data), name)
+    return data
+
+
+def mark_transferred(stream, name):
+    stream.write('done {}\n'.format(name).encode())
+    if _readline(stream) != 'ok':
+        raise TransferError('Cannot mark {} as downloaded'.format(name))
+
+
+def _file_crc(path):
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(RANGE_SIZE), b''):
+            crc = binascii.crc32(chunk, crc)
+    return crc
+
+
+def sync_sessions(stream, out_dir, range_size=RANGE_SIZE):
+    """
+    Downloads every session the tracker has not marked as downloaded,
+    resuming partial downloads, and marks each verified one as downloaded
+    so the tracker can free its flash.
+    :return: List of downloaded paths
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, (size, _, crc, transferred) in sorted(list_sessions(stream).items()):
+        if transferred:
+            continue
+        name = os.path.basename(name)
+        path = os.path.join(out_dir, name)
+        if not (os.path.exists(path) and _file_crc(path) == crc):
+            partial = path + '.part'
+            offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+            if offset > size:
+                offset = 0
+            with open(partial, 'r+b' if offset else 'wb') as f:
+                f.seek(offset)
+                f.truncate()
+                while offset < size:
+                    data = fetch_range(stream, name, offset, min(range_size, size - offset))
+                    if not len(data):
+                        break
+                    f.write(memoryview(data))
+                    f.flush()
+                    offset += len(data)
+
+            if _file_crc(partial) != crc:
+                os.remove(partial)
+                print(ChecksumError(name, 'Corrupted transfer of {}'.format(name)), file=sys.stderr)
+                continue
+            os.replace(partial, path)
+        mark_transferred(stream, name)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    import serial  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(description='Download sessions from a tracker')
+    parser.add_argument('port')
+    parser.add_argument('out_dir', nargs='?', default='sessions')
+    parser.add_argument('--text', action='store_true', help='use the base64 text transfer')
+    parser.add_argument('--sync', action='store_true', help='resumable download of new sessions only')
+    args = parser.parse_args(argv)
+
+    with serial.Serial(args.port, 115200, timeout=10) as stream:
+        stream.reset_input_buffer()
+        if args.sync:
+            paths = sync_sessions(stream, args.out_dir)
+        else:
+            stream.write(b'sendfiles\n' if args.text else b'sendfiles bin\n')
+            paths = receive_sessions(stream, args.out_dir, binary=not args.text)
+        for path in paths:
+            print(path)
+
+
+if __name__ == '__main__':
+    main()
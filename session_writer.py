@@ -0,0 +1,235 @@
+"""
+Writes binary session logs on the tracker, see `session_format` for the
+layout.
+
+Records are collected in a block sized buffer and the file is only
+written in whole blocks, apart from the last one written by `flush()`.
+
+`write()` and `write_raw()` run the read, encode and commit steps of a
+record in one call, capture loops which time the steps separately call
+`read_raw()`, `stamp()` or `encode()` and `commit()` instead.
+
+Raw sessions with `FLAG_DELTA` pass every record through a `DeltaEncoder`
+and only buffer whole frames.
+"""
+
+# pylint: disable=import-error
+import ubinascii
+import ustruct
+import utime
+# pylint: enable=import-error
+
+from delta_encoder import DeltaEncoder
+from session_format import (
+    MAGIC, FORMAT_VERSION, RECORD_FLOAT32, RECORD_RAW, FLAG_TIMESTAMPS, FLAG_FOOTER, FLAG_DELTA, HEADER_FMT,
+    TIMESTAMP_FMT, FLOAT32_FMT, record_size
+)
+
+# LittleFS block size on the Pico flash
+BLOCK_SIZE = 4096
+
+
+def to_base64(data):
+    """
+    Encodes a packed record as fixed width base64 text, 4 characters per 3
+    bytes, eg. 56 for a float record with timestamp. Decode with
+    `session_reader.from_base64()`.
+    """
+    return ubinascii.b2a_base64(data)[:-1].decode()
+
+
+class SessionWriter:
+    """Class which writes a session header and packed records to a stream."""
+    def __init__(
+        self, stream, sensor, sample_freq, record_format=RECORD_FLOAT32, flags=0,
+        block_size=BLOCK_SIZE
+    ):
+        """
+        Buffers the session header describing `sensor` for `stream`.
+        :param stream: A file opened in binary mode
+        :param sensor: The MPU9250 the session is recorded from, already
+            calibrated
+        :param sample_freq: The configured sample rate in Hz
+        :param record_format: One of the `session_format.RECORD_*` values
+        :param flags: `session_format.FLAG_*` bits
+        :param block_size: Size of the writes to `stream` in bytes
+        """
+        self._stream = stream
+        self._block_size = block_size
+        self._block = bytearray(block_size)
+        self._block_view = memoryview(self._block)
+        self._fill = 0
+        self._sensor = sensor
+        self._record = bytearray(record_size(record_format, flags))
+        self._timestamps = bool(flags & FLAG_TIMESTAMPS)
+        self._footer = bool(flags & FLAG_FOOTER)
+        self._delta = None
+        if flags & FLAG_DELTA:
+            if record_format != RECORD_RAW:
+                raise ValueError('Only raw sessions are delta compressed')
+            self._delta = DeltaEncoder(flags)
+        # Sample values follow the optional timestamp, raw registers are
+        # read straight into the record
+        self._values = 4 if self._timestamps else 0
+        record = memoryview(self._record)
+        self._motion = record[self._values:self._values + 14]
+        self._mag = record[self._values + 14:self._values + 20]
+        self.records = 0
+
+        self.bytes_written = 0
+        self.crc = 0
+        self.flushes = 0
+        self.worst_flush_us = 0
+
+        header = self._header(sensor, sample_freq, record_format, flags)
+        self._append(header, len(header))
+
+    def write(self, gyro, acceleration, magnetic, elapsed_us=0):
+        """
+        Packs one sample into the reusable record buffer and writes it.
+        :param gyro: X, Y, Z rad/s
+        :param acceleration: X, Y, Z m/s^2
+        :param magnetic: X, Y, Z uT
+        :param elapsed_us: Microseconds since the previous sample, only
+            logged with `FLAG_TIMESTAMPS`
+        """
+        self.encode(gyro, acceleration, magnetic, elapsed_us)
+        self.commit()
+
+    def write_raw(self, elapsed_us=0):
+        """
+        Reads unscaled register values from the sensor into the record
+        buffer and writes it. Only valid for `RECORD_RAW` sessions.
+        :param elapsed_us: Microseconds since the previous sample, only
+            logged with `FLAG_TIMESTAMPS`
+        """
+        self.stamp(elapsed_us)
+        self.read_raw()
+        self.commit()
+
+    def read_raw(self):
+        """
+        Reads unscaled register values from the sensor into the record
+        buffer. Only valid for `RECORD_RAW` sessions.
+        """
+        self._sensor.read_raw_into(self._motion, self._mag)
+
+    def stamp(self, elapsed_us):
+        """
+        Packs the timestamp of the record, only logged with `FLAG_TIMESTAMPS`.
+        """
+        if self._timestamps:
+            ustruct.pack_into(TIMESTAMP_FMT, self._record, 0, elapsed_us)
+
+    def encode(self, gyro, acceleration, magnetic, elapsed_us=0):
+        """
+        Packs one sample into the record buffer, see `write()`.
+        """
+        self.stamp(elapsed_us)
+        gx, gy, gz = gyro
+        ax, ay, az = acceleration
+        mx, my, mz = magnetic
+        ustruct.pack_into(FLOAT32_FMT, self._record, self._values, gx, gy, gz, ax, ay, az, mx, my, mz)
+
+    def commit(self):
+        """
+        Writes the record buffer.
+        """
+        if self._delta is None:
+            self._append(self._record, len(self._record))
+        elif self._delta.add(self._record):
+            self._write_frame()
+        self.records += 1
+
+    def write_records(self, buf, count):
+        """
+        Writes records which are already packed in the session layout, eg.
+        drained from a `SampleRing`.
+        :param buf: `count` records
+        :param count: The number of records in `buf`
+        """
+        if self._delta is None:
+            self._append(buf, len(buf))
+        else:
+            size = len(self._record)
+            for i in range(count):
+                if self._delta.add(buf, i * size):
+                    self._write_frame()
+        self.records += count
+
+    def write_footer(self, footer):
+        """
+        Writes the session footer after the last record. Only valid for
+        sessions with `FLAG_FOOTER`.
+        :param footer: Packed `session_format.FOOTER_FMT`, see
+            `LoopStats.pack()`
+        """
+        if not self._footer:
+            raise ValueError('Session has no footer')
+        self._write_frame()
+        self._append(footer, len(footer))
+
+    def flush(self):
+        """
+        Writes the partially filled block and flushes the stream. Call once
+        when the session stops.
+        """
+        self._write_frame()
+        if self._fill:
+            self._write_block(self._block_view[:self._fill])
+            self._fill = 0
+        self._stream.flush()
+
+    @property
+    def record(self):
+        """ The last packed record. """
+        return self._record
+
+    def _append(self, data, size):
+        fill = self._fill
+        block_size = self._block_size
+        if fill + size < block_size:
+            self._block[fill:fill + size] = data
+            self._fill = fill + size
+            return
+
+        # Complete the current block, write any whole blocks directly and
+        # keep the rest
+        data = memoryview(data)
+        pos = block_size - fill
+        self._block[fill:block_size] = data[:pos]
+        self._write_block(self._block)
+        while size - pos >= block_size:
+            self._write_block(data[pos:pos + block_size])
+            pos += block_size
+        self._fill = size - pos
+        self._block[0:self._fill] = data[pos:size]
+
+    def _write_frame(self):
+        # Buffers the current delta frame, if any
+        if self._delta is not None and self._delta.count:
+            frame = self._delta.frame()
+            self._append(frame, len(frame))
+
+    def _write_block(self, data):
+        start = utime.ticks_us()
+        self._stream.write(data)
+        took = utime.ticks_diff(utime.ticks_us(), start)
+
+        self.bytes_written += len(data)
+        self.crc = ubinascii.crc32(data, self.crc)
+        self.flushes += 1
+        if took > self.worst_flush_us:
+            self.worst_flush_us = took
+
+    @staticmethod
+    def _header(sensor, sample_freq, record_format, flags):
+        mpu6500 = sensor.mpu6500
+        ak8963 = sensor.ak8963
+        return ustruct.pack(
+            HEADER_FMT, MAGIC, FORMAT_VERSION, record_format, flags, sample_freq,
+            mpu6500._accel_so, mpu6500._accel_sf, mpu6500._gyro_so, mpu6500._gyro_sf,
+            *(mpu6500._accel_offset + mpu6500._gyro_offset + (ak8963._so,)
+              + tuple(ak8963._adjustement) + tuple(ak8963._offset) + tuple(ak8963._scale)
+              + tuple(sensor._mag_axis_map) + tuple(sensor._mag_axis_sign))
+        )
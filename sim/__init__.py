@@ -0,0 +1,98 @@
+"""
+Host side simulation of the tracker hardware, so the drivers, the
+acquisition modules and main.py run, are profiled and load tested in
+CPython.
+
+    >>> import sim
+    >>> mpu, ak = sim.install(sim.SensorData.synthetic(2000), rate=1000)
+    >>> import machine, mpu9250
+    >>> i2c = machine.I2C(0)
+    >>> sensor = mpu9250.MPU9250(i2c)
+    >>> sensor.read_motion()
+    >>> i2c.transactions, mpu.reads, ak.reads
+
+`install()` registers the stand-in modules `machine`, `utime`,
+`micropython` and `uasyncio`, and the standard modules under their
+MicroPython names (`ustruct`, `ubinascii`, `ujson`, ...), in `sys.modules`
+and adds `mem_free()` and `mem_alloc()` to `gc`. It must run before the
+tracker modules are imported. The MPU6500 and AK8963 models serve raw
+samples of a recorded session, see `SensorData.load()`, or a synthetic
+one, advancing with the wall clock at `rate`.
+
+main.py itself runs with
+
+    $ python -m sim --session sessions/3.bin --rate 1000 main.py
+
+from a scratch directory the tracker may write its sessions to.
+"""
+
+import binascii
+import gc
+import io
+import json
+import os
+import select
+import struct
+import sys
+
+from sim import machine, micropython, uasyncio, utime
+from sim.devices import SensorData, Device, MPU6500Model, AK8963Model
+
+MPU6500_ADDRESS = 0x68
+AK8963_ADDRESS = 0x0c
+
+# Heap size of the RP2040 port
+HEAP_SIZE = 192 * 1024
+# Live CPython blocks at install(), the interpreter itself is not on the heap
+_base_blocks = 0
+
+
+def _mem_alloc():
+    # Live CPython blocks as a stand-in for the MicroPython heap use
+    return max(min((sys.getallocatedblocks() - _base_blocks) * 16, HEAP_SIZE), 0)
+
+
+def _mem_free():
+    return HEAP_SIZE - _mem_alloc()
+
+
+def install(data=None, rate=1000, mag_odr=100):
+    """
+    Registers the stand-in modules and puts an MPU6500 and AK8963 serving
+    `data` on the I2C bus.
+    :param data: SensorData, synthetic if None
+    :param rate: Sample rate of `data` in Hz
+    :param mag_odr: Output data rate of the AK8963 in Hz
+    :return: Tuple of the MPU6500Model and AK8963Model
+    """
+    if data is None:
+        data = SensorData.synthetic(rate=rate)
+    mpu = MPU6500Model(data, rate)
+    ak = AK8963Model(data, rate, mag_odr)
+    machine.devices.clear()
+    machine.devices[MPU6500_ADDRESS] = mpu
+    machine.devices[AK8963_ADDRESS] = ak
+
+    # MicroPython extensions of gc
+    global _base_blocks  # pylint: disable=global-statement
+    _base_blocks = sys.getallocatedblocks()
+    if not hasattr(gc, 'mem_free'):
+        gc.mem_free = _mem_free
+        gc.mem_alloc = _mem_alloc
+
+    sys.modules.update({
+        'machine': machine,
+        'micropython': micropython,
+        'uasyncio': uasyncio,
+        'utime': utime,
+        'ubinascii': binascii,
+        'uio': io,
+        'ujson': json,
+        'uos': os,
+        'uselect': select,
+        'ustruct': struct,
+    })
+    return mpu, ak
+
+
+__all__ = ['install', 'SensorData', 'Device', 'MPU6500Model', 'AK8963Model']
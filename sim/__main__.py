@@ -0,0 +1,54 @@
+"""
+Runs a tracker script against the simulated hardware and prints the I2C
+traffic when it exits.
+
+    $ python -m sim [--session PATH] [--rate HZ] [--seconds S] main.py
+"""
+
+import argparse
+import os
+import runpy
+import signal
+import sys
+import threading
+import time
+
+import sim
+
+
+def _report(devices, start):
+    elapsed = time.perf_counter() - start
+    for name, device in devices:
+        sys.stderr.write('{}: {} reads ({} bytes), {} writes ({} bytes), {:.0f} transactions/s\n'.format(
+            name, device.reads, device.bytes_read, device.writes, device.bytes_written,
+            (device.reads + device.writes) / elapsed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a tracker script on simulated hardware')
+    parser.add_argument('script')
+    parser.add_argument('--session', help='session file to replay, synthetic data if omitted')
+    parser.add_argument('--rate', type=int, default=1000, help='sample rate of the session data in Hz')
+    parser.add_argument('--mag-odr', type=int, default=100, help='AK8963 output data rate in Hz')
+    parser.add_argument('--seconds', type=float, help='stop the script after this long')
+    args = parser.parse_args(argv)
+
+    data = sim.SensorData.load(args.session) if args.session else None
+    mpu, ak = sim.install(data, args.rate, args.mag_odr)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+
+    if args.seconds is not None:
+        # Raises KeyboardInterrupt in the script
+        threading.Timer(args.seconds, os.kill, (os.getpid(), signal.SIGINT)).start()
+
+    start = time.perf_counter()
+    try:
+        runpy.run_path(args.script, run_name='__main__')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _report((('MPU6500', mpu), ('AK8963', ak)), start)
+
+
+if __name__ == '__main__':
+    main()
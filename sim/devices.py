@@ -0,0 +1,295 @@
+"""
+Register models of the MPU6500 and AK8963 which serve raw samples from a
+recorded or synthetic session at a fixed output data rate. With the data
+ready interrupt enabled the MPU6500 pulses its INT pin, `machine.Pin` of
+`int_pin`, for every new sample.
+"""
+
+import struct
+import threading
+import time
+
+import numpy as np
+
+from sim import machine
+
+# Driver defaults, see mpu6500.py and ak8963.py
+_ACCEL_SO = 16384
+_GYRO_SO = 131
+_SF_M_S2 = 9.80665
+_SF_RAD_S = 0.017453292519943
+_TEMP_SO = 333.87
+_TEMP_OFFSET = 21
+_MAG_SO = 0.15
+
+_SMPLRT_DIV = 0x19
+_CONFIG = 0x1a
+_FIFO_EN = 0x23
+_INT_ENABLE = 0x38
+_INT_STATUS = 0x3a
+_ACCEL_XOUT_H = 0x3b
+_USER_CTRL = 0x6a
+_FIFO_COUNTH = 0x72
+_FIFO_R_W = 0x74
+_WHO_AM_I = 0x75
+
+_FIFO_MODE_STOP = 0b01000000
+_USER_CTRL_FIFO_EN = 0b01000000
+_USER_CTRL_FIFO_RST = 0b00000100
+_FIFO_OFLOW_INT = 0b00010000
+_RAW_DATA_RDY_INT = 0b00000001
+_RAW_RDY_EN = 0b00000001
+_FIFO_SIZE = 512
+
+_WIA = 0x00
+_ST1 = 0x02
+_HXL = 0x03
+_ST2 = 0x09
+_ASAX = 0x10
+
+
+class SensorData:
+    """
+    Raw register counts of a session, `motion` is an `n x 7` int16 array of
+    accel X, Y, Z, temperature and gyro X, Y, Z, `mag` an `n x 3` int16
+    array of AK8963 X, Y, Z.
+    """
+
+    def __init__(self, motion, mag):
+        if len(motion) != len(mag) or not len(motion):
+            raise ValueError('Expecting the same non-zero number of motion and mag samples')
+        self.motion = np.asarray(motion, dtype=np.int16)
+        self.mag = np.asarray(mag, dtype=np.int16)
+
+    def __len__(self):
+        return len(self.motion)
+
+    @classmethod
+    def from_session(cls, session):
+        """
+        Converts a decoded session back to the register counts the drivers
+        read, undoing the calibration in its header. Text sessions have no
+        header and are converted with the driver defaults.
+        :param session: See `session_reader.decode()`
+        """
+        if session.version == 0:
+            accel = (_ACCEL_SO, _SF_M_S2, (0, 0, 0))
+            gyro = (_GYRO_SO, _SF_RAD_S, (0, 0, 0))
+            mag = (_MAG_SO, (1, 1, 1), (0, 0, 0), (1, 1, 1), (0, 1, 2), (1, 1, 1))
+        else:
+            accel = (session.accel_so, session.accel_sf, session.accel_offset)
+            gyro = (session.gyro_so, session.gyro_sf, session.gyro_offset)
+            mag = (session.mag_so, session.mag_adjustment, session.mag_offset, session.mag_scale,
+                   session.mag_axis_map, session.mag_axis_sign)
+
+        motion = np.zeros((len(session), 7))
+        so, sf, offset = accel
+        motion[:, 0:3] = (session.acceleration + offset) / sf * so
+        so, sf, offset = gyro
+        motion[:, 4:7] = (session.gyro + offset) / sf * so
+        if session.temperature is not None:
+            motion[:, 3] = (session.temperature - _TEMP_OFFSET) * _TEMP_SO + _TEMP_OFFSET
+
+        so, adjustment, offset, scale, axis_map, axis_sign = mag
+        counts = np.zeros((len(session), 3))
+        counts[:, list(axis_map)] = session.magnetic * axis_sign
+        counts = (counts / scale + offset) / (np.array(adjustment) * so)
+
+        return cls(_to_int16(motion), _to_int16(counts))
+
+    @classmethod
+    def synthetic(cls, n=1000, rate=100, spin=1.0, noise=20, seed=0):
+        """
+        A tracker lying flat and turning about Z at `spin` rad/s in a 40 uT
+        field, with Gaussian count noise.
+        :param n: Number of samples
+        :param rate: Sample rate in Hz the spin is generated at
+        """
+        rng = np.random.default_rng(seed)
+        heading = np.arange(n) * spin / rate
+        motion = np.zeros((n, 7))
+        motion[:, 2] = _ACCEL_SO
+        motion[:, 3] = (25 - _TEMP_OFFSET) * _TEMP_SO + _TEMP_OFFSET
+        motion[:, 6] = spin / _SF_RAD_S * _GYRO_SO
+        motion[:, [0, 1, 2, 4, 5, 6]] += rng.normal(0, noise, (n, 6))
+        mag = np.zeros((n, 3))
+        mag[:, 0] = 20 / _MAG_SO * np.cos(heading)
+        mag[:, 1] = -20 / _MAG_SO * np.sin(heading)
+        mag[:, 2] = -35 / _MAG_SO
+        mag += rng.normal(0, noise / 10, (n, 3))
+        return cls(_to_int16(motion), _to_int16(mag))
+
+    @classmethod
+    def load(cls, path, text_freq=20):
+        """
+        Reads a binary or text session file, see `from_session()`.
+        """
+        import session_reader  # pylint: disable=import-outside-toplevel
+        if path.endswith('.txt'):
+            return cls.from_session(session_reader.load_text(path, text_freq))
+        return cls.from_session(session_reader.load(path))
+
+
+def _to_int16(values):
+    return np.clip(np.round(values), -32768, 32767).astype(np.int16)
+
+
+class Device:
+    """
+    Base class of the register models. Counts every transaction and byte
+    on the device.
+    """
+
+    def __init__(self, data, rate):
+        """
+        :param data: SensorData served by the data registers, looped
+        :param rate: Sample rate of `data` in Hz, samples advance with the
+            wall clock at this rate
+        """
+        self.data = data
+        self.rate = rate
+        self.registers = bytearray(256)
+        self.reads = 0
+        self.writes = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @property
+    def sample(self):
+        """Index of the sample currently in the data registers."""
+        return int((time.perf_counter() - self._start) * self.rate)
+
+    def read(self, register, n):
+        with self._lock:
+            self.reads += 1
+            self.bytes_read += n
+            return self._read(register, n)
+
+    def write(self, register, data):
+        with self._lock:
+            self.writes += 1
+            self.bytes_written += len(data)
+            for i, value in enumerate(data):
+                self._write(register + i, value)
+
+    def _read(self, register, n):
+        return bytes(self.registers[register:register + n])
+
+    def _write(self, register, value):
+        self.registers[register] = value
+
+
+class MPU6500Model(Device):
+    """
+    MPU6500 with the data registers, data ready status and the FIFO of
+    accel, temperature and gyro samples. `rate` is the internal sample rate
+    the FIFO and interrupt rates are divided down from, `int_pin` the id of
+    the Pin wired to INT, see `ACQUISITION = 'drdy'` in main.py.
+    """
+
+    def __init__(self, data, rate=1000, int_pin=16):
+        super().__init__(data, rate)
+        self.int_pin = int_pin
+        self.registers[_WHO_AM_I] = 0x71
+        self._fifo = bytearray()
+        self._fifo_sample = self.sample
+        self._ready_sample = -1
+        self._interrupt = None
+
+    def _read(self, register, n):
+        sample = self.sample
+        self._fill_fifo(sample)
+        if register == _FIFO_R_W:
+            out = bytes(self._fifo[:n]).ljust(n, b'\xff')
+            del self._fifo[:n]
+            return out
+        if register == _FIFO_COUNTH:
+            return struct.pack('>H', len(self._fifo))[:n]
+
+        out = bytearray(self.registers[register:register + n])
+        data = struct.pack('>7h', *self.data.motion[sample % len(self.data)].tolist())
+        for i in range(n):
+            if _ACCEL_XOUT_H <= register + i < _ACCEL_XOUT_H + 14:
+                out[i] = data[register + i - _ACCEL_XOUT_H]
+        if register <= _INT_STATUS < register + n:
+            # Status bits clear on read
+            ready = _RAW_DATA_RDY_INT if sample != self._ready_sample else 0
+            out[_INT_STATUS - register] = self.registers[_INT_STATUS] | ready
+            self.registers[_INT_STATUS] = 0
+            self._ready_sample = sample
+        return bytes(out)
+
+    def _write(self, register, value):
+        if register == _USER_CTRL and value & _USER_CTRL_FIFO_RST:
+            self._fifo = bytearray()
+            self._fifo_sample = self.sample
+            value &= ~_USER_CTRL_FIFO_RST
+        if register == _USER_CTRL and value & ~self.registers[_USER_CTRL] & _USER_CTRL_FIFO_EN:
+            self._fifo_sample = self.sample
+        if register == _INT_ENABLE:
+            self._data_ready_interrupt(value & _RAW_RDY_EN)
+        self.registers[register] = value
+
+    def _data_ready_interrupt(self, enable):
+        if self._interrupt is not None:
+            self._interrupt.set()
+            self._interrupt = None
+        if enable:
+            self._interrupt = threading.Event()
+            threading.Thread(target=self._pulse, args=(self._interrupt,), daemon=True).start()
+
+    def _pulse(self, stop):
+        # A rising edge on INT whenever the divided down sample changes
+        divider = self.registers[_SMPLRT_DIV] + 1
+        sample = (self.sample // divider + 1) * divider
+        while not stop.wait(max(0, self._start + sample / self.rate - time.perf_counter())):
+            pin = machine.pins.get(self.int_pin)
+            if pin is not None:
+                pin.set(1)
+                pin.set(0)
+            sample += divider
+
+    def _fill_fifo(self, sample):
+        enabled = self.registers[_USER_CTRL] & _USER_CTRL_FIFO_EN and self.registers[_FIFO_EN]
+        if not enabled:
+            self._fifo_sample = sample
+            return
+        # FIFO rate is the data rate divided by 1 + SMPLRT_DIV
+        divider = self.registers[_SMPLRT_DIV] + 1
+        for i in range(self._fifo_sample, sample):
+            if (i + 1) % divider:
+                continue
+            if len(self._fifo) + 14 > _FIFO_SIZE:
+                self.registers[_INT_STATUS] |= _FIFO_OFLOW_INT
+                if self.registers[_CONFIG] & _FIFO_MODE_STOP:
+                    break
+                del self._fifo[:14]
+            self._fifo += struct.pack('>7h', *self.data.motion[(i + 1) % len(self.data)].tolist())
+        self._fifo_sample = sample
+
+
+class AK8963Model(Device):
+    """
+    AK8963 with the data registers and a sensitivity adjustment of 1. The
+    data registers update at `odr` Hz, with the sample of the session at
+    that time.
+    """
+
+    def __init__(self, data, rate=1000, odr=100):
+        super().__init__(data, rate)
+        self.odr = odr
+        self.registers[_WIA] = 0x48
+        self.registers[_ASAX:_ASAX + 3] = b'\x80\x80\x80'
+        self.registers[_ST1] = 1  # data ready
+        self.registers[_ST2] = 0x10  # 16 bit output
+
+    def _read(self, register, n):
+        out = bytearray(self.registers[register:register + n])
+        sample = int((time.perf_counter() - self._start) * self.odr) * self.rate // self.odr
+        data = struct.pack('<3h', *self.data.mag[sample % len(self.data)].tolist())
+        for i in range(n):
+            if _HXL <= register + i < _HXL + 6:
+                out[i] = data[register + i - _HXL]
+        return bytes(out)
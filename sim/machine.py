@@ -0,0 +1,143 @@
+"""
+Stand-in for the MicroPython `machine` module. `I2C` talks to the register
+models of `sim.devices`, `Pin` inputs are driven from the host or the
+models with `Pin.set()` and `Timer` callbacks run on a thread.
+"""
+
+import threading
+import time
+
+# Devices on every bus by address, set by `sim.install()`
+devices = {}
+# Last Pin created for every id, so the models can drive their outputs
+pins = {}
+
+
+class I2C:
+    """
+    I2C bus of the devices in `devices`, counts transactions and bytes.
+    """
+
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):  # pylint: disable=redefined-builtin
+        self.id = id
+        self.freq = freq
+        self.transactions = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def _device(self, addr):
+        try:
+            return devices[addr]
+        except KeyError:
+            raise OSError(19, 'ENODEV') from None
+
+    def scan(self):
+        return sorted(devices)
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        data = self._device(addr).read(memaddr, len(buf))
+        buf[:] = data
+        self.transactions += 1
+        self.bytes_read += len(buf)
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(addr, memaddr, buf)
+        return bytes(buf)
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self._device(addr).write(memaddr, bytes(buf))
+        self.transactions += 1
+        self.bytes_written += len(buf)
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):  # pylint: disable=redefined-builtin
+        self.id = id
+        self.mode = mode
+        self._value = 0 if value is None else int(bool(value))
+        self._handler = None
+        self._trigger = 0
+        pins[id] = self
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = int(bool(value))
+        return None
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(not self._value)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        self._handler = handler
+        self._trigger = trigger
+
+    def set(self, value):
+        """
+        Drives the pin from the host, eg. pressing a button, and runs the
+        interrupt handler on a matching edge.
+        """
+        value = int(bool(value))
+        edge = 0
+        if value != self._value:
+            edge = Pin.IRQ_RISING if value else Pin.IRQ_FALLING
+        self._value = value
+        if self._handler is not None and edge & self._trigger:
+            self._handler(self)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, mode=PERIODIC, freq=-1, period=-1, callback=None):  # pylint: disable=redefined-builtin
+        self._stop = None
+        if callback is not None:
+            self.init(mode=mode, freq=freq, period=period, callback=callback)
+
+    def init(self, mode=PERIODIC, freq=-1, period=-1, callback=None):
+        self.deinit()
+        period_s = 1 / freq if freq > 0 else period / 1000
+        self._stop = threading.Event()
+        thread = threading.Thread(target=self._run, args=(mode, period_s, callback, self._stop), daemon=True)
+        thread.start()
+
+    def _run(self, mode, period_s, callback, stop):
+        deadline = time.perf_counter()
+        while True:
+            deadline += period_s
+            if stop.wait(max(0, deadline - time.perf_counter())):
+                return
+            callback(self)
+            if mode == Timer.ONE_SHOT:
+                return
+
+    def deinit(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+
+def freq(hz=None):
+    if hz is None:
+        return 125000000
+    return None
+
+
+def reset():
+    raise SystemExit('machine.reset()')
@@ -0,0 +1,26 @@
+"""
+Stand-in for the MicroPython `micropython` module.
+"""
+
+
+def const(value):
+    return value
+
+
+def native(function):
+    return function
+
+
+viper = native
+
+
+def schedule(function, arg):
+    function(arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def mem_info(verbose=None):
+    pass
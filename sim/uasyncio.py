@@ -0,0 +1,50 @@
+"""
+Stand-in for the MicroPython `uasyncio` module on top of `asyncio`.
+"""
+
+import asyncio
+from asyncio import *  # pylint: disable=wildcard-import,unused-wildcard-import,redefined-builtin
+
+
+async def sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+
+class ThreadSafeFlag:
+    """
+    Flag which interrupt handlers, ie. `machine` callbacks on other threads,
+    set for a waiting task.
+    """
+
+    def __init__(self):
+        self._event = asyncio.Event()
+        self._loop = None
+
+    def set(self):
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self):
+        self._loop = asyncio.get_running_loop()
+        await self._event.wait()
+        self._event.clear()
+
+
+class StreamReader:
+    """
+    Reader of a blocking stream, eg. `sys.stdin.buffer`, which reads on a
+    worker thread. At the end of the stream it waits forever.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    async def readline(self):
+        line = await asyncio.to_thread(self._stream.readline)
+        while not line:
+            # stdin of the tracker never ends, sleeping keeps the task
+            # referenced by the event loop
+            await asyncio.sleep(3600)
+        return line
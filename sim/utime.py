@@ -0,0 +1,54 @@
+"""
+Stand-in for the MicroPython `utime` module, ticks wrap around at 2**30
+like on the RP2040 port.
+"""
+
+import time as _time
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_HALF = _TICKS_PERIOD // 2
+
+_start = _time.perf_counter()
+
+
+def ticks_us():
+    return int((_time.perf_counter() - _start) * 1000000) % _TICKS_PERIOD
+
+
+def ticks_ms():
+    return int((_time.perf_counter() - _start) * 1000) % _TICKS_PERIOD
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % _TICKS_PERIOD
+
+
+def ticks_diff(ticks1, ticks2):
+    return (ticks1 - ticks2 + _TICKS_HALF) % _TICKS_PERIOD - _TICKS_HALF
+
+
+def sleep(seconds):
+    _time.sleep(seconds)
+
+
+def sleep_ms(ms):
+    _time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    # Busy wait the short sleeps of the sample loops, time.sleep() is too
+    # coarse for them
+    end = _time.perf_counter() + us / 1000000
+    if us > 2000:
+        _time.sleep(us / 1000000 - 0.001)
+    while _time.perf_counter() < end:
+        pass
+
+
+def time_ns():
+    return _time.time_ns()
+
+
+localtime = _time.localtime
+mktime = _time.mktime
+time = _time.time
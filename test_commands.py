@@ -0,0 +1,56 @@
+"""
+Tests of the serial command dispatcher, run with `python -m pytest`.
+"""
+
+import io
+import sys
+
+try:
+    import utime  # pylint: disable=unused-import
+except ImportError:
+    import sim
+    sim.install()
+
+import uasyncio
+
+import commands
+
+
+@commands.command('test-int')
+def _int(args):
+    sys.stdout.write('int {}\n'.format(int(args[0])))
+
+
+@commands.command('test-async')
+async def _fail_async(args):
+    await uasyncio.sleep_ms(1)
+    raise OSError(28)
+
+
+def _serve(data, last):
+    # Serves the command lines in `data` until the handler of `last` ran
+    ran = []
+
+    @commands.command(last)
+    def done(args):
+        sys.stdout.write('done\n')
+        ran.append(args)
+
+    async def run():
+        server = uasyncio.create_task(commands.serve(io.BytesIO(data)))
+        for _ in range(500):
+            if ran:
+                break
+            await uasyncio.sleep_ms(10)
+        server.cancel()
+
+    uasyncio.run(run())
+    return ran
+
+
+def test_bad_command_keeps_serving(capsys):
+    data = b'test-int abc\n\xff\xfe\ntest-async\ntest-int\ntest-int 3\ntest-done\n'
+    assert _serve(data, 'test-done') == [[]]
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split(' ', 1)[0] for line in lines] == ['error'] * 4 + ['int', 'done']
+    assert lines[-2] == 'int 3'
@@ -0,0 +1,147 @@
+"""
+Reference trajectory tests of the Madgwick filter, run with
+`python -m pytest`. Gyro, accelerometer and magnetometer readings are
+generated from known orientations, the class and the `_fast` updates have
+to converge to and track them within a tolerance and iteration budget.
+"""
+
+import math
+import random
+
+import pytest
+
+from madgwick_ahrs import MadgwickAHRS, update_6DOF_fast, update_9DOF_fast
+from quaternion import Quaternion
+
+GRAVITY = (0, 0, 9.81)
+# Earth field in uT, north along X with a downward inclination
+FIELD = (24, 0, -32)
+
+
+def _reading(q, v):
+    # Earth frame vector `v` as measured in the sensor frame of orientation `q`
+    return tuple(q.conj() * Quaternion(0, *v) * q)[1:4]
+
+
+def _random_orientation(rng):
+    axis = [rng.gauss(0, 1) for _ in range(3)]
+    n = math.sqrt(sum(x * x for x in axis))
+    return Quaternion.from_angle_axis(rng.uniform(-2.5, 2.5), *(x / n for x in axis))
+
+
+def _trajectory(q, rate, n, sample_period):
+    """
+    Orientations of a constant body rate `rate` in rad/s from `q` and their
+    gyro, accelerometer and magnetometer readings.
+    """
+    angle = math.sqrt(sum(x * x for x in rate))
+    step = Quaternion.from_angle_axis(angle * sample_period, *(x / angle for x in rate))
+    for _ in range(n):
+        q = q * step
+        yield q, rate, _reading(q, GRAVITY), _reading(q, FIELD)
+
+
+def _class(dof):
+    def start(q, beta, sample_period):
+        ahrs = MadgwickAHRS(sample_period, Quaternion(*q), beta)
+
+        def update(gyroscope, accelerometer, magnetometer):
+            if dof == 9:
+                ahrs.update_9DOF(gyroscope, accelerometer, magnetometer)
+            else:
+                ahrs.update_6DOF(gyroscope, accelerometer)
+            return ahrs.quaternion
+        return update
+    return start
+
+
+def _fast(dof):
+    def start(q, beta, sample_period):
+        q = list(q)
+
+        def update(gyroscope, accelerometer, magnetometer):
+            if dof == 9:
+                update_9DOF_fast(q, gyroscope, accelerometer, magnetometer, beta, sample_period)
+            else:
+                update_6DOF_fast(q, gyroscope, accelerometer, beta, sample_period)
+            return Quaternion(q)
+        return update
+    return start
+
+
+FILTERS = [
+    pytest.param(6, _class(6), id='update_6DOF'),
+    pytest.param(9, _class(9), id='update_9DOF'),
+    pytest.param(6, _fast(6), id='update_6DOF_fast'),
+    pytest.param(9, _fast(9), id='update_9DOF_fast'),
+]
+
+
+def _error(dof, q, reference):
+    """
+    Orientation error, the heading is only observable with the magnetometer
+    so 6DOF compares the gravity direction.
+    """
+    if dof == 6:
+        return max(abs(a - b) for a, b in zip(_reading(q, (0, 0, 1)), _reading(reference, (0, 0, 1))))
+    # q and -q are the same orientation
+    return min(math.sqrt(sum((a - b) ** 2 for a, b in zip(q, reference))),
+               math.sqrt(sum((a + b) ** 2 for a, b in zip(q, reference))))
+
+
+@pytest.mark.parametrize('dof, start', FILTERS)
+def test_converges_from_identity(dof, start):
+    # At rest in a random orientation, within 0.01 after 5 s at 100 Hz
+    rng = random.Random(dof)
+    for _ in range(10):
+        reference = _random_orientation(rng)
+        update = start((1, 0, 0, 0), 0.5, 0.01)
+        accelerometer = _reading(reference, GRAVITY)
+        magnetometer = _reading(reference, FIELD)
+        for _ in range(500):
+            q = update((0, 0, 0), accelerometer, magnetometer)
+        assert _error(dof, q, reference) < 0.01
+
+
+@pytest.mark.parametrize('dof, start', FILTERS)
+def test_tracks_rotation(dof, start):
+    # Started on the trajectory, 10 s of turning at 2 rad/s about a tilted
+    # axis. The first order integration lags by about 0.01 at this rate.
+    rng = random.Random(dof)
+    reference = _random_orientation(rng)
+    update = start(reference, 0.041, 0.01)
+    worst = 0
+    for reference, gyroscope, accelerometer, magnetometer in _trajectory(reference, (0.5, -1, 1.6), 1000, 0.01):
+        worst = max(worst, _error(dof, update(gyroscope, accelerometer, magnetometer), reference))
+    assert worst < 0.02
+
+
+@pytest.mark.parametrize('dof', [6, 9])
+def test_fast_matches_class(dof):
+    # Noisy readings, both implementations have to agree to rounding
+    rng = random.Random(dof)
+    slow = _class(dof)((1, 0, 0, 0), 0.1, 0.01)
+    fast = _fast(dof)((1, 0, 0, 0), 0.1, 0.01)
+    for _ in range(2000):
+        gyroscope = tuple(rng.uniform(-2, 2) for _ in range(3))
+        accelerometer = tuple(rng.uniform(-10, 10) for _ in range(3))
+        magnetometer = tuple(rng.uniform(-50, 50) for _ in range(3))
+        a = slow(gyroscope, accelerometer, magnetometer)
+        b = fast(gyroscope, accelerometer, magnetometer)
+        assert max(abs(x - y) for x, y in zip(a, b)) < 1e-9
+
+
+@pytest.mark.parametrize('dof', [6, 9])
+def test_kept_quaternions_do_not_change(dof):
+    # Every update binds a new quaternion, the ones kept from earlier steps
+    # stay as they were
+    ahrs = MadgwickAHRS(0.01, Quaternion(1, 0, 0, 0), 0.1)
+    kept = []
+    for _, gyroscope, accelerometer, magnetometer in _trajectory(ahrs.quaternion, (0.5, -1, 1.6), 50, 0.01):
+        if dof == 9:
+            ahrs.update_9DOF(gyroscope, accelerometer, magnetometer)
+        else:
+            ahrs.update_6DOF(gyroscope, accelerometer)
+        kept.append((ahrs.quaternion, tuple(ahrs.quaternion)))
+    assert all(tuple(q) == values for q, values in kept)
+    assert len(set(id(q) for q, _ in kept)) == len(kept)
@@ -0,0 +1,151 @@
+"""
+Tests of the host side session decoding against the tracker encoders, run
+with `python -m pytest`.
+"""
+
+import io
+import random
+import struct
+import types
+
+try:
+    import utime  # pylint: disable=unused-import
+except ImportError:
+    import sim
+    sim.install()
+
+import numpy as np
+import pytest
+
+import session_reader
+from session_format import (
+    RECORD_RAW, FLAG_TIMESTAMPS, FLAG_FOOTER, FLAG_DELTA, HEADER_SIZE, FOOTER_FMT, FOOTER_MAGIC, FOOTER_SIZE,
+    FRAME_FMT, KEYFRAME_INTERVAL, FLOAT32_FMT
+)
+from session_writer import SessionWriter, to_base64
+
+
+class NullStream:
+    """Binary stream which discards everything written to it."""
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class StaticSensor:
+    """
+    MPU9250 with fixed calibration, everything `SessionWriter` reads of it
+    for the session header, whose raw reads return the 20 byte register
+    blocks of `raw` in turn.
+    """
+    def __init__(self, raw=()):
+        self._raw = iter(raw)
+        self.mpu6500 = types.SimpleNamespace(
+            _accel_so=16384, _accel_sf=9.80665, _gyro_so=131, _gyro_sf=0.017453292519943,
+            _accel_offset=(0.1, -0.2, 0.3), _gyro_offset=(0.01, 0.02, -0.03))
+        self.ak8963 = types.SimpleNamespace(
+            _so=0.15, _adjustement=(1.1, 1.2, 0.9), _offset=(2, -3, 4), _scale=(1, 1.05, 0.95))
+        self._mag_axis_map = (1, 0, 2)
+        self._mag_axis_sign = (1, 1, -1)
+
+    def read_raw_into(self, motion, mag):
+        raw = next(self._raw)
+        motion[:] = raw[:14]
+        mag[:] = raw[14:]
+
+
+def _float32(values):
+    # Values as stored in a float record
+    return struct.unpack(FLOAT32_FMT, struct.pack(FLOAT32_FMT, *values))
+
+
+@pytest.mark.parametrize('flags, width', [(FLAG_TIMESTAMPS, 56), (0, 48)])
+def test_base64_round_trip(flags, width):
+    rng = random.Random(flags)
+    writer = SessionWriter(NullStream(), StaticSensor(), 20, flags=flags)
+    for _ in range(200):
+        values = [rng.uniform(-1e3, 1e3) for _ in range(9)]
+        elapsed = rng.randrange(2 ** 32)
+        writer.write(values[0:3], values[3:6], values[6:9], elapsed)
+
+        text = to_base64(writer.record)
+        assert len(text) == width
+        decoded = session_reader.from_base64(text, flags)
+        if flags & FLAG_TIMESTAMPS:
+            assert decoded[0] == elapsed
+            decoded = decoded[1:]
+        assert decoded == _float32(values)
+
+
+def _raw_records(n, seed):
+    """
+    `n` random raw records of elapsed microseconds and register block. The
+    counts mostly move by a few hundred with some full range jumps which
+    wrap around 16 bits, the timestamps include 32 bit extremes so their
+    differences wrap too.
+    """
+    rng = random.Random(seed)
+    counts = [rng.randrange(-0x8000, 0x8000) for _ in range(10)]
+    records = []
+    for _ in range(n):
+        for i in range(10):
+            step = rng.randrange(-0x8000, 0x8000) if rng.random() < 0.05 else rng.randint(-300, 300)
+            counts[i] = (counts[i] + step + 0x8000) % 0x10000 - 0x8000
+        elapsed = rng.choice((rng.randint(49000, 51000), rng.randrange(2 ** 32), 0, 2 ** 32 - 1))
+        records.append((elapsed, struct.pack('>7h', *counts[:7]) + struct.pack('<3h', *counts[7:])))
+    return records
+
+
+def _raw_session(records, flags, footer=None):
+    # Session file of `records` written by the tracker's writer
+    stream = io.BytesIO()
+    writer = SessionWriter(stream, StaticSensor(raw for _, raw in records), 20, record_format=RECORD_RAW,
+                           flags=flags)
+    for elapsed, _ in records:
+        writer.write_raw(elapsed)
+    if footer is not None:
+        writer.write_footer(footer)
+    writer.flush()
+    return stream.getvalue()
+
+
+def _assert_same_samples(session, expected, n):
+    assert len(session) == n
+    for name in ('time', 'gyro', 'acceleration', 'magnetic', 'temperature'):
+        assert np.array_equal(getattr(session, name), getattr(expected, name)[:n]), name
+
+
+@pytest.mark.parametrize('flags', [FLAG_TIMESTAMPS, 0])
+@pytest.mark.parametrize('n', [0, 1, KEYFRAME_INTERVAL - 1, KEYFRAME_INTERVAL, KEYFRAME_INTERVAL + 1, 300])
+def test_delta_matches_raw(flags, n):
+    records = _raw_records(n, n)
+    plain = session_reader.decode(_raw_session(records, flags))
+    delta = session_reader.decode(_raw_session(records, flags | FLAG_DELTA))
+    _assert_same_samples(delta, plain, n)
+
+
+@pytest.mark.parametrize('flags', [FLAG_TIMESTAMPS, 0])
+def test_delta_cut_off_in_frame(flags):
+    # A power loss in the third frame keeps the two complete ones
+    records = _raw_records(300, 1)
+    plain = session_reader.decode(_raw_session(records, flags))
+    data = _raw_session(records, flags | FLAG_DELTA)
+    pos = HEADER_SIZE
+    for _ in range(2):
+        pos += struct.unpack_from(FRAME_FMT, data, pos)[0]
+    size = struct.unpack_from(FRAME_FMT, data, pos)[0]
+    delta = session_reader.decode(data[:pos + size // 2])
+    _assert_same_samples(delta, plain, 2 * KEYFRAME_INTERVAL)
+
+
+def test_delta_with_footer():
+    records = _raw_records(200, 2)
+    footer = struct.pack(FOOTER_FMT, *range(19), FOOTER_MAGIC, FOOTER_SIZE)
+    flags = FLAG_TIMESTAMPS | FLAG_FOOTER
+    plain = session_reader.decode(_raw_session(records, flags, footer))
+    delta = session_reader.decode(_raw_session(records, flags | FLAG_DELTA, footer))
+    _assert_same_samples(delta, plain, 200)
+    assert delta.stats == plain.stats
+    assert delta.stats['missed'] == 18
@@ -0,0 +1,163 @@
+"""
+Streams session files to the host over the USB serial console with
+constant memory use.
+
+For every file the tracker sends
+
+    FILE <name> <size>\\n
+    <length> <crc32> <base64 data>\\n     one line per chunk of at most CHUNK_SIZE bytes
+    END <crc32>\\n
+
+where the CRC32s are lower case hex of the chunk and of the whole file.
+
+In binary mode the count and FILE lines are the same, but the chunks are
+written as raw bytes straight to the USB CDC stream. Every chunk is a
+`FRAME_FMT` frame header of the chunk length and CRC32 followed by the
+data, a frame header with length 0 and the CRC32 of the whole file ends
+the file.
+
+The file is only deleted after the host answers with an `ack <name>` line,
+a `nak <name>` or no answer within ACK_TIMEOUT_MS keeps it for the next
+transfer. Answers naming another file, eg. an `ack` of the previous file
+which arrived after its timeout, are skipped, so they can not delete the
+file being sent. See `session_sync.py` for the host side.
+
+`send_range()` sends part of a session for the incremental `get` command
+as a
+
+    RANGE <name> <offset> <length>\n
+
+line followed by binary frames, `length` is clamped to the end of the
+file.
+"""
+
+# pylint: disable=import-error
+import os
+import select
+import ubinascii
+import ustruct
+import utime
+# pylint: enable=import-error
+
+CHUNK_SIZE = 512
+BINARY_CHUNK_SIZE = 4096
+ACK_TIMEOUT_MS = 5000
+
+FRAME_FMT = '<HI'
+
+
+def send_file(path, name, out, buf=bytearray(CHUNK_SIZE)):
+    """
+    Sends one file in chunks read into the reused buffer `buf`.
+    :param path: Path of the file
+    :param name: Name the host stores the file as
+    :param out: Text stream to write to, ie. `sys.stdout`
+    """
+    view = memoryview(buf)
+    crc = 0
+    out.write('FILE {} {}\n'.format(name, os.stat(path)[6]))
+    with open(path, 'rb') as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            chunk = view[:n]
+            crc = ubinascii.crc32(chunk, crc)
+            out.write('{} {:08x} '.format(n, ubinascii.crc32(chunk)))
+            out.write(ubinascii.b2a_base64(chunk).decode())  # newline terminated
+    out.write('END {:08x}\n'.format(crc))
+
+
+def send_file_binary(path, name, out, buf=bytearray(BINARY_CHUNK_SIZE), frame=bytearray(6)):
+    """
+    Sends one file as raw framed chunks read into the reused buffer `buf`.
+    :param path: Path of the file
+    :param name: Name the host stores the file as
+    :param out: Binary stream to write to, ie. `sys.stdout.buffer`
+    """
+    size = os.stat(path)[6]
+    out.write('FILE {} {}\n'.format(name, size).encode())
+    with open(path, 'rb') as f:
+        _send_frames(f, size, out, buf, frame)
+
+
+def send_range(path, name, offset, length, out, buf=bytearray(BINARY_CHUNK_SIZE), frame=bytearray(6)):
+    """
+    Sends `length` bytes of a file from `offset` as binary frames.
+    :param path: Path of the file
+    :param name: Name the host knows the file as
+    :param out: Binary stream to write to, ie. `sys.stdout.buffer`
+    """
+    size = os.stat(path)[6]
+    offset = min(offset, size)
+    length = min(length, size - offset)
+    out.write('RANGE {} {} {}\n'.format(name, offset, length).encode())
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        _send_frames(f, length, out, buf, frame)
+
+
+def _send_frames(f, length, out, buf, frame):
+    view = memoryview(buf)
+    crc = 0
+    while length:
+        n = f.readinto(view[:min(length, len(buf))])
+        if not n:
+            break
+        chunk = view[:n]
+        crc = ubinascii.crc32(chunk, crc)
+        ustruct.pack_into(FRAME_FMT, frame, 0, n, ubinascii.crc32(chunk))
+        out.write(frame)
+        out.write(chunk)
+        length -= n
+    ustruct.pack_into(FRAME_FMT, frame, 0, 0, crc)
+    out.write(frame)
+
+
+def wait_ack(inp, name, timeout_ms=ACK_TIMEOUT_MS):
+    """
+    Waits for the host to acknowledge a file, skipping answers for other
+    files.
+    :param inp: Text stream to read from, ie. `sys.stdin`
+    :param name: Name the file was sent as
+    :return: True if the host answered `ack <name>`
+    """
+    poll = select.poll()
+    poll.register(inp, select.POLLIN)
+    deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
+    while True:
+        remaining = utime.ticks_diff(deadline, utime.ticks_ms())
+        if remaining <= 0 or not poll.poll(remaining):
+            return False
+        answer, _, answered = inp.readline().rstrip('\r\n').partition(' ')
+        if answered == name:
+            return answer == 'ack'
+
+
+def send_sessions(directory, names, out, inp, binary=False):
+    """
+    Sends the number of files followed by every file in `names`, deleting
+    each one the host acknowledges.
+    :param out: Text stream to write to, ie. `sys.stdout`. Binary mode
+        writes to its `buffer`.
+    :param inp: Text stream to read acks from, ie. `sys.stdin`
+    :param binary: Send raw framed chunks instead of base64 lines
+    :return: The number of files acknowledged
+    """
+    count = '{}\n'.format(len(names))
+    if binary:
+        out = out.buffer
+        out.write(count.encode())
+    else:
+        out.write(count)
+    acked = 0
+    for name in names:
+        path = '{}/{}'.format(directory, name)
+        if binary:
+            send_file_binary(path, name, out)
+        else:
+            send_file(path, name, out)
+        if wait_ack(inp, name):
+            os.remove(path)
+            acked += 1
+    return acked